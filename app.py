@@ -1,14 +1,27 @@
+import time
+run_started = time.perf_counter()
+
 import os
+import importlib
+import sys
 import streamlit as st
-from upload import upload_page
-from gestion import gestion_page
-from stats import stats_page
+import metrics
 # from dotenv import load_dotenv
 # load_dotenv()
 # PASSWORD = os.getenv("PASSWORD")
 
 PASSWORD = st.secrets["PASSWORD"]
 
+# Pages de l'application : libellé du bouton, module et fonction d'affichage.
+# Le module d'une page (et ses dépendances : pandas, extract_msg, st_aggrid...) n'est importé
+# qu'à sa première ouverture, l'écran de connexion s'affiche donc sans eux.
+PAGES = {
+    "Upload": ("📩 Importation", "upload", "upload_page"),
+    "Applications": ("🗂️ Candidatures", "gestion", "gestion_page"),
+    "Statistiques": ("📊 Statistiques", "stats", "stats_page"),
+    "Performance": ("⚡ Performance", "performance", "performance_page"),
+}
+
 st.set_page_config(layout="wide")  # Wide mode by default
 
 # Inject custom CSS to set the width of the sidebar and dialog
@@ -30,6 +43,17 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+@st.cache_resource(show_spinner=False)
+def process_state():
+    """État partagé par les sessions du processus : le premier rendu est le démarrage à froid."""
+    return {"cold": True}
+
+def render_page(page):
+    """Importe le module de la page à la première ouverture, puis l'affiche."""
+    _, module_name, function_name = PAGES[page]
+    with metrics.span("app.page", page=page, first_load=module_name not in sys.modules):
+        getattr(importlib.import_module(module_name), function_name)()
+
 def login():
     st.title("🔐 Connexion")
     password_input = st.text_input("Mot de passe :", type="password")
@@ -38,6 +62,7 @@ def login():
         if password_input == PASSWORD:
             st.success("✅ Accès autorisé !")
             st.session_state["authenticated"] = True
+            st.session_state["login_started"] = run_started  # Mesure du temps d'accès à la première page
             st.rerun()
         else:
             st.error("Mot de passe incorrect.")
@@ -53,16 +78,20 @@ if not st.session_state["authenticated"]:
     login()
 else:
     # Barre latérale avec boutons de navigation
-    if st.sidebar.button("📩 Importation"):
-        st.session_state["current_page"] = "Upload"
-    if st.sidebar.button("🗂️ Candidatures"):
-        st.session_state["current_page"] = "Applications"
-    if st.sidebar.button("📊 Statistiques"):
-        st.session_state["current_page"] = "Statistiques"
+    for page, (label, _, _) in PAGES.items():
+        if st.sidebar.button(label):
+            st.session_state["current_page"] = page
     # Affichage de la page sélectionnée
-    if st.session_state["current_page"] == "Upload":
-        upload_page()
-    elif st.session_state["current_page"] == "Applications":
-        gestion_page()
-    elif st.session_state["current_page"] == "Statistiques":
-        stats_page()
+    render_page(st.session_state["current_page"])
+
+    if "login_started" in st.session_state:
+        metrics.emit("app.login", time.perf_counter() - st.session_state.pop("login_started"))
+
+# Temps de démarrage : premier rendu du processus (imports compris), puis rendu de l'écran de connexion.
+# Avant la connexion, les spans restent en tampon : l'écran de connexion n'ouvre jamais la connexion à MongoDB.
+state = process_state()
+if state["cold"]:
+    state["cold"] = False
+    metrics.emit("app.cold_start", time.perf_counter() - run_started, defer=not st.session_state["authenticated"])
+elif not st.session_state["authenticated"]:
+    metrics.emit("app.login_screen", time.perf_counter() - run_started, defer=True)
@@ -0,0 +1,120 @@
+"""
+Micro-benchmark de l'anonymisation : compare `utils.anonymize_cv` à l'implémentation
+d'origine (une compilation de regex et un `re.sub` par fragment de nom à chaque appel)
+sur des CV synthétiques longs, et vérifie que les sorties sont identiques.
+
+Usage : python -m benchmarks.bench_anonymize [--cvs 200] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import time
+
+import metrics
+from utils import anonymize_cv
+
+
+def anonymize_cv_reference(text_cv, noms_from_email):
+    """Implémentation d'origine de `anonymize_cv`, conservée comme référence."""
+    email_match = re.search(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', text_cv)
+    extracted_email = email_match.group(0) if email_match else None
+
+    if extracted_email:
+        domain_match = re.search(r"@[^@]+(\.com|\.net|\.fr)", extracted_email)
+        if domain_match:
+            extracted_email = extracted_email[:domain_match.end()]
+
+    phone_pattern = re.compile(r'''
+        (?<!\d)
+        (?:\+?\d{1,3}[-.\s]?)?
+        (?!2\d{3}[-.\s])
+        (?:\(?[3-9]\d{1,3}\)?[-.\s]?)?
+        (?:\d{2,4}[-.\s]?){2,3}
+        \d{2,4}
+        (?!\d)
+    ''', re.VERBOSE)
+
+    phone_matches = phone_pattern.findall(text_cv)
+    filtered_matches = [match for match in phone_matches if not match.strip().startswith(('1', '2'))]
+    extracted_phone = filtered_matches[0] if filtered_matches else None
+
+    for nom in sorted(noms_from_email, key=len, reverse=True):
+        text_cv = re.sub(rf'(?i){re.escape(nom)}', '[ANONYMISÉ]', text_cv)
+
+    text_cv = re.sub(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', '[EMAIL]', text_cv)
+
+    if extracted_phone:
+        text_cv = text_cv.replace(extracted_phone, '[TÉL]')
+
+    text_cv = re.sub(r'\d{1,5}\s+\w+(?:\s+\w+)*(?:,\s*\w+(?:\s+\w+)*)?,?\s*\d{5}', '[ADRESSE]', text_cv)
+
+    return text_cv, extracted_email, extracted_phone
+
+
+FIRST_NAMES = ["Jean-Pierre", "Marie", "Léa", "Thomas", "Nicolas", "Camille", "Sébastien", "Inès"]
+LAST_NAMES = ["Dupont", "Martin", "Lefèvre", "Nguyen", "Moreau", "Benali", "Rousseau", "Garnier"]
+WORDS = (
+    "data engineer python spark airflow sql dbt kafka snowflake modélisation pipeline équipe "
+    "projet client mission développement analyse tableau power bi machine learning mise en production"
+).split()
+
+
+def generate_cv(rng, paragraphs=60):
+    """Génère un CV synthétique contenant nom, email, téléphone, adresse et années."""
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    header = (
+        f"{first} {last.upper()} - {first.lower()}.{last.lower()}@gmail.com - "
+        f"06 {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} - "
+        f"{rng.randint(1, 200)} rue de la Paix, {rng.randint(10000, 95999)} Paris"
+    )
+    body = []
+    for _ in range(paragraphs):
+        start = rng.randint(2010, 2023)
+        body.append(
+            f"{start} - {start + rng.randint(1, 3)} "
+            + " ".join(rng.choice(WORDS) for _ in range(rng.randint(15, 40)))
+        )
+    body.append(f"Références : {first} {last}, {last.lower()}@exemple.fr")
+    return header + " " + " ".join(body), [first, last]
+
+
+def _time(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text, names in corpus:
+            fn(text, names)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cvs", type=int, default=200, help="Nombre de CV synthétiques")
+    parser.add_argument("--paragraphs", type=int, default=60, help="Nombre de paragraphes par CV")
+    parser.add_argument("--repeat", type=int, default=5, help="Nombre de répétitions (on garde la meilleure)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    metrics.disable()  # anonymize_cv est instrumenté : on ne mesure que l'anonymisation
+    rng = random.Random(args.seed)
+    corpus = [generate_cv(rng, args.paragraphs) for _ in range(args.cvs)]
+
+    mismatches = sum(
+        anonymize_cv(text, names) != anonymize_cv_reference(text, names) for text, names in corpus
+    )
+
+    reference = _time(anonymize_cv_reference, corpus, args.repeat)
+    current = _time(anonymize_cv, corpus, args.repeat)
+    chars = sum(len(text) for text, _ in corpus)
+
+    print(f"{len(corpus)} CV, {chars / len(corpus):.0f} caractères en moyenne")
+    print(f"référence : {reference * 1000:.1f} ms")
+    print(f"actuel    : {current * 1000:.1f} ms (x{reference / current:.2f})")
+    print(f"sorties différentes : {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
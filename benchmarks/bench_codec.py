@@ -0,0 +1,58 @@
+"""
+Benchmark du codec de stockage : gain de place et temps de décompression sur un corpus de CV.
+
+Usage : python -m benchmarks.bench_codec DOSSIER [--repeat 20]
+(DOSSIER contient des fichiers .pdf / .docx, par exemple un export de CV)
+"""
+import argparse
+import os
+import time
+
+import codec
+
+CODEC_NAMES = {codec.RAW: "brut", codec.ZLIB: "zlib", codec.ZSTD: "zstd"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="Dossier contenant les CV (.pdf, .docx)")
+    parser.add_argument("--repeat", type=int, default=20, help="Nombre de décompressions par fichier")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+        if os.path.splitext(name)[1].lower() in (".pdf", ".docx")
+    )
+    if not paths:
+        raise SystemExit(f"Aucun fichier .pdf ou .docx dans {args.corpus}")
+
+    print(f"codec : {'zstd' if codec.zstandard is not None else 'zlib'}")
+    totals = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        payload = codec.encode(data)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            codec.decode(payload)
+        decode_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+        extension = os.path.splitext(path)[1].lower()
+        raw, stored, decode_total, count = totals.get(extension, (0, 0, 0.0, 0))
+        totals[extension] = (raw + len(data), stored + len(payload), decode_total + decode_ms, count + 1)
+        print(
+            f"{os.path.basename(path)[:40]:40} {len(data) / 1024:9.1f} Ko -> {len(payload) / 1024:9.1f} Ko "
+            f"({CODEC_NAMES[payload[0]]}) décompression {decode_ms:.2f} ms"
+        )
+
+    print()
+    for extension, (raw, stored, decode_total, count) in sorted(totals.items()):
+        print(
+            f"{extension} : {count} fichier(s), {raw / 1024:.0f} Ko -> {stored / 1024:.0f} Ko "
+            f"(gain {100 * (1 - stored / raw):.1f} %), décompression moyenne {decode_total / count:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Benchmark de bout en bout de l'import, étape par étape, sur un corpus synthétique (benchmarks.corpus) :
+lecture du .msg (extract_msg.Message), extraction de la pièce jointe (getResume), extraction du texte
+(extract_text_from_pdf / extract_text_from_docx), anonymisation (anonymize_cv), compaction, puis le
+pipeline complet avec un LLM factice (llm_backends.FakeBackend) et MongoDB en mémoire (mongomock).
+
+Les résultats sont enregistrés en JSON (un fichier par commit dans benchmarks/results/) et peuvent être
+comparés à ceux d'un commit précédent.
+
+Usage : python -m benchmarks.bench_pipeline [--corpus DOSSIER] [--count 60] [--repeat 3] [--compare FICHIER.json]
+"""
+import argparse
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import extract_msg
+import mongomock
+import streamlit as st
+
+import metrics
+from benchmarks.corpus import generate
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def load_pipeline():
+    """
+    Importe le pipeline sur une base MongoDB en mémoire (mongomock) : config.py est utilisé tel quel,
+    avec des secrets factices et un client mongomock.
+    """
+    # mongomock ne connaît pas l'argument `sort` ajouté aux UpdateOne par les versions récentes de pymongo
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    mongomock.collection.BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+
+    secrets = {"GOOGLE_API_KEY": "benchmark", "MONGO_URI": "mongodb://benchmark"}
+    with mock.patch("pymongo.MongoClient", mongomock.MongoClient), mock.patch.object(st, "secrets", secrets):
+        import config
+        config.get_db()  # Client partagé (st.cache_resource) : créé ici, sur mongomock
+        import pipeline
+    return config, pipeline
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {
+        "count": len(durations),
+        "total_ms": round(sum(durations) * 1000, 2),
+        "mean_ms": round(statistics.fmean(durations) * 1000, 3),
+        "p50_ms": round(durations[len(durations) // 2] * 1000, 3),
+        "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 3),
+    }
+
+
+def timed(timings, stage, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+
+def bench_stages(pipeline, mails, repeat):
+    """Temps de chaque étape de la préparation d'un mail, mail par mail."""
+    timings = {}
+    for _ in range(repeat):
+        for filename, msg_bytes in mails:
+            msg = timed(timings, "extract_msg.Message", extract_msg.Message, io.BytesIO(msg_bytes))
+            _, noms = pipeline.parse_filename(filename)
+            resume = timed(timings, "getResume", pipeline.getResume, msg)
+            if not resume:
+                continue
+            resume_name, resume_file = resume
+            with resume_file:
+                if resume_name.endswith(".pdf"):
+                    text = timed(timings, "extract_text_from_pdf", pipeline.extract_text_from_pdf, resume_file, keep_lines=True)
+                else:
+                    text = timed(timings, "extract_text_from_docx", pipeline.extract_text_from_docx, resume_file, keep_lines=True)
+            if not text:
+                continue
+            anonymized, _, _ = timed(timings, "anonymize_cv", pipeline.anonymize_cv, text, [n for n in noms if len(n) > 2])
+            timed(timings, "compact_cv", pipeline.compact_cv, anonymized, pipeline.CV_TOKEN_BUDGET)
+    return timings
+
+
+def bench_pipeline(config, pipeline, mails, repeat, latency):
+    """Pipeline complet (LLM factice + enregistrement dans mongomock), sur une base vidée à chaque passe."""
+    from llm_backends import FakeBackend
+    from llm_cache import ExtractionCache
+    from rate_limit import RateLimiter
+
+    durations = []
+    for _ in range(repeat):
+        for collection in (config.collection, config.cache_collection, config.blob_collection, config.journal_collection):
+            collection.delete_many({})
+        pipeline.llm_backend = FakeBackend(latency=latency)
+        cache = ExtractionCache(config.cache_collection, config.LLM_CACHE_TTL_DAYS, config.LLM_CACHE_MAX_ENTRIES)
+        limiter = RateLimiter(10**6, 10**12, burst=10**6)  # Pas d'attente de quota : on mesure le pipeline
+
+        start = time.perf_counter()
+        for result in pipeline.process_mails(mails, cache, limiter=limiter):
+            pipeline.commit_result(result, store_cv=True)
+        durations.append(time.perf_counter() - start)
+    return {
+        **summarize(durations),
+        "mails": len(mails),
+        "llm_requests": pipeline.llm_backend.calls,
+        "mails_per_second": round(len(mails) / min(durations), 1),
+    }
+
+
+def compare(results, previous):
+    """Affiche l'évolution des temps moyens par rapport à un résultat précédent."""
+    print(f"\nComparaison avec {previous['commit']} ({previous['date']}) :")
+    if previous["corpus"] != results["corpus"]:
+        print("  (attention : corpus différent, les temps ne sont pas directement comparables)")
+    for stage, stats in results["stages"].items():
+        if stage in previous["stages"]:
+            before, after = previous["stages"][stage]["mean_ms"], stats["mean_ms"]
+            change = (after - before) / before * 100 if before else 0
+            print(f"  {stage:<24} {before:>10.3f} ms -> {after:>10.3f} ms ({change:+.1f} %)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Dossier de fichiers .msg (par défaut : corpus synthétique généré)")
+    parser.add_argument("--count", type=int, default=60, help="Taille du corpus synthétique")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de passes sur le corpus")
+    parser.add_argument("--latency", default="0", help="Latence du LLM factice (voir llm_backends.parse_latency)")
+    parser.add_argument("--output", help="Fichier de résultats (par défaut : benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Résultats précédents à comparer")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    metrics.disable()  # On mesure le pipeline, pas l'écriture des mesures
+    config, pipeline = load_pipeline()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.corpus or tmp
+        if not args.corpus:
+            generate(folder, args.count, args.seed)
+        mails = []
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(".msg"):
+                with open(os.path.join(folder, name), "rb") as f:
+                    mails.append((name, f.read()))
+    if not mails:
+        raise SystemExit("Aucun fichier .msg dans le corpus")
+
+    # Les traces des extracteurs sont écartées : seule la synthèse s'affiche
+    with open(os.devnull, "w") as devnull, mock.patch("sys.stdout", devnull):
+        stages = {stage: summarize(durations) for stage, durations in bench_stages(pipeline, mails, args.repeat).items()}
+        stages["pipeline"] = bench_pipeline(config, pipeline, mails, args.repeat, args.latency)
+
+    results = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "corpus": {"mails": len(mails), "bytes": sum(len(data) for _, data in mails),
+                   "source": args.corpus or f"synthétique (seed {args.seed})"},
+        "repeat": args.repeat,
+        "stages": stages,
+    }
+
+    print(f"{len(mails)} mails, {results['corpus']['bytes'] / 1e6:.1f} Mo, {args.repeat} passe(s)")
+    for stage, stats in stages.items():
+        print(f"  {stage:<24} n={stats['count']:<5} moyenne {stats['mean_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+    print(f"  débit du pipeline : {stages['pipeline']['mails_per_second']} mails/s, "
+          f"{stages['pipeline']['llm_requests']} requêtes au LLM")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés dans {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+"""
+Générateur d'un corpus synthétique de candidatures LinkedIn : fichiers .msg au format attendu par
+l'import ("... application_ <job> from <nom>.msg", corps séparé par des \\t\\r\\n), avec un CV en
+pièce jointe : PDF texte, PDF image (scan, sans texte extractible) ou DOCX (avec tableaux),
+de tailles variées.
+
+Usage : python -m benchmarks.corpus DOSSIER [--count 60] [--seed 0]
+"""
+import argparse
+import datetime
+import io
+import os
+import random
+import struct
+
+from docx import Document
+from PIL import Image, ImageDraw
+
+FIRST_NAMES = ["Camille", "Léa", "Hugo", "Nicolas", "Inès", "Julien", "Sofia", "Mehdi", "Chloé", "Thomas", "Amandine", "Yanis"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Lefèvre", "Moreau", "Garnier", "Benali", "Rousseau", "Nguyen", "Girard"]
+JOBS = ["Data Engineer", "Data Scientist", "Data Analyst", "Analytics Engineer", "ML Engineer"]
+TITLES = ["Data Engineer chez {}", "Data Scientist freelance", "Consultant Data | {}", "Analyste BI - {}", "Étudiant en data science"]
+CITIES = [("Paris", "75011"), ("Lyon", "69003"), ("Nantes", "44000"), ("Lille", "59000"), ("Bordeaux", "33000")]
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Soylent", "Stark Industries", "Wayne Enterprises"]
+SCHOOLS = ["Université Paris-Saclay", "École Centrale de Lyon", "INSA Toulouse", "Télécom Paris", "Université de Lille"]
+SKILLS = ["Python", "SQL", "Spark", "Airflow", "dbt", "Kafka", "Docker", "Kubernetes", "Snowflake", "BigQuery", "Power BI", "Tableau"]
+WORDS = (
+    "conception mise en place pipeline données industrialisation modèles tableau de bord migration cloud "
+    "optimisation requêtes qualité supervision équipe métier automatisation reporting prévision API"
+).split()
+HOBBIES = ["Randonnée en montagne et trail", "Photographie argentique", "Cuisine du monde", "Course à pied, semi-marathon"]
+
+# Taille des CV : nombre d'expériences et de lignes par expérience
+SIZES = {"small": (2, 3), "medium": (5, 6), "large": (14, 12)}
+# Répartition des types de pièces jointes
+ATTACHMENT_KINDS = [("pdf", 0.5), ("docx", 0.35), ("image_pdf", 0.15)]
+
+
+# ---------------------------------------------------------------------------
+# Contenu des CV
+
+def cv_content(rng, name, size):
+    """Contenu d'un CV : en-tête (répété en haut de chaque page) et sections [(titre, lignes)]."""
+    city, postal_code = rng.choice(CITIES)
+    email = f"{name.split()[0].lower()}.{name.split()[1].lower()}@example.com"
+    phone = "06 " + " ".join(f"{rng.randint(0, 99):02d}" for _ in range(4))
+    header = f"{name} - {rng.choice(JOBS)} - {email} - {phone}"
+
+    experiences, lines_per_experience = SIZES[size]
+    year = 2024
+    experience_lines = []
+    for _ in range(experiences):
+        start = year - rng.randint(1, 3)
+        contract = rng.choice(["CDI", "CDI", "Stage", "Alternance", "Freelance"])
+        experience_lines.append(f"{rng.choice(JOBS)} - {rng.choice(COMPANIES)} ({contract})")
+        experience_lines.append(f"{start} - {year}")
+        experience_lines += [" ".join(rng.choices(WORDS, k=rng.randint(8, 16))).capitalize() for _ in range(lines_per_experience)]
+        year = start
+
+    sections = [
+        ("Profil", [f"{rng.randint(1, 200)} rue de la République, {postal_code} {city}",
+                    " ".join(rng.choices(WORDS, k=30)).capitalize()]),
+        ("Expérience professionnelle", experience_lines),
+        ("Formation", [f"Master Data Science - {rng.choice(SCHOOLS)}", f"09/{year - 2} - 06/{year}"]),
+        ("Compétences", [", ".join(rng.sample(SKILLS, 6))]),
+        ("Langues", ["Anglais courant", "Espagnol intermédiaire"]),
+        ("Centres d'intérêt", rng.sample(HOBBIES, 2)),
+    ]
+    return header, sections
+
+
+def cv_lines(sections):
+    return [line for title, lines in sections for line in [title.upper(), *lines, ""]]
+
+
+# ---------------------------------------------------------------------------
+# PDF
+
+def _pdf(objects):
+    """Assemble un PDF à partir de ses objets (le premier est le catalogue)."""
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    out.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def _stream(data, extra=b""):
+    return b"<< /Length %d %s>>\nstream\n" % (len(data), extra) + data + b"\nendstream"
+
+
+def _pdf_pages(page_contents, resources):
+    """PDF A4 dont chaque page a le contenu donné ; les objets des pages commencent au numéro 4."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, resources]
+    kids = []
+    for content in page_contents:
+        page_number = len(objects) + 1
+        kids.append(f"{page_number} 0 R")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources 3 0 R "
+                       f"/Contents {page_number + 1} 0 R >>".encode())
+        objects.append(_stream(content))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+    return objects
+
+
+def _paginate(header, lines, lines_per_page=55):
+    return [[header, ""] + lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[header]]
+
+
+def make_pdf(header, sections):
+    """PDF texte, avec l'en-tête du CV répété en haut de chaque page et un numéro de page en bas."""
+    pages = _paginate(header, cv_lines(sections))
+    contents = []
+    for number, page in enumerate(pages, start=1):
+        text = [b"BT /F1 10 Tf 50 800 Td 13 TL"]
+        for line in page:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            text.append(b"(" + escaped.encode("cp1252", "replace") + b") Tj T*")
+        text.append(f"ET BT /F1 8 Tf 290 30 Td ({number} / {len(pages)}) Tj ET".encode())
+        contents.append(b"\n".join(text))
+    font = b"<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >> >> >>"
+    return _pdf(_pdf_pages(contents, font))
+
+
+def make_image_pdf(header, sections):
+    """PDF scanné : chaque page est une image JPEG, sans texte extractible."""
+    pages = _paginate(header, cv_lines(sections))
+    images = []
+    for page in pages:
+        image = Image.new("L", (1240, 1754), 255)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(page):
+            draw.text((100, 100 + row * 28), line, fill=0)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=60)
+        images.append(buffer.getvalue())
+
+    # Ressources : une image par page (/Im1, /Im2...), déclarées après les pages
+    first_image = 4 + 2 * len(pages)
+    xobjects = " ".join(f"/Im{i + 1} {first_image + i} 0 R" for i in range(len(pages)))
+    contents = [f"q 595 0 0 842 0 0 cm /Im{i + 1} Do Q".encode() for i in range(len(pages))]
+    objects = _pdf_pages(contents, f"<< /XObject << {xobjects} >> >>".encode())
+    objects += [
+        _stream(data, b"/Type /XObject /Subtype /Image /Width 1240 /Height 1754 /ColorSpace /DeviceGray "
+                      b"/BitsPerComponent 8 /Filter /DCTDecode ")
+        for data in images
+    ]
+    return _pdf(objects)
+
+
+# ---------------------------------------------------------------------------
+# DOCX
+
+def make_docx(header, sections):
+    """DOCX avec l'en-tête dans un tableau aux cellules fusionnées, et les compétences en tableau."""
+    document = Document()
+    table = document.add_table(rows=1, cols=3)
+    merged = table.cell(0, 0).merge(table.cell(0, 2))  # Texte répété dans chaque cellule de la ligne
+    merged.text = header
+
+    for title, lines in sections:
+        document.add_heading(title, level=2)
+        if title == "Compétences":
+            skills = lines[0].split(", ")
+            skills_table = document.add_table(rows=2, cols=3)
+            for i, skill in enumerate(skills):
+                skills_table.cell(i // 3, i % 3).text = skill
+        else:
+            for line in lines:
+                document.add_paragraph(line)
+
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Fichiers .msg (format Outlook : fichier composé OLE / CFB)
+
+FREESECT, ENDOFCHAIN, FATSECT, NOSTREAM = 0xFFFFFFFF, 0xFFFFFFFE, 0xFFFFFFFD, 0xFFFFFFFF
+SECTOR_SIZE, MINI_SECTOR_SIZE, MINI_STREAM_CUTOFF = 512, 64, 4096
+
+
+def _cfb_sort_key(name):
+    # Ordre des entrées d'un répertoire CFB : longueur du nom, puis nom en majuscules
+    return len(name), name.upper()
+
+
+def write_cfb(tree):
+    """
+    Écrit un fichier composé (CFB version 3). `tree` associe à chaque nom le contenu d'un flux (bytes)
+    ou un sous-stockage (dict). Les frères d'un stockage sont chaînés par le lien droit, dans l'ordre CFB.
+    """
+    entries = []  # [nom, type, enfants, données]
+
+    def add(name, node):
+        index = len(entries)
+        if isinstance(node, dict):
+            entries.append([name, 1, [], None])
+            entries[index][2] = [add(child, node[child]) for child in sorted(node, key=_cfb_sort_key)]
+        else:
+            entries.append([name, 2, [], node])
+        return index
+
+    entries.append(["Root Entry", 5, [], None])
+    entries[0][2] = [add(child, tree[child]) for child in sorted(tree, key=_cfb_sort_key)]
+
+    # Petits flux dans le mini-flux (secteurs de 64 octets), les autres dans des secteurs de 512 octets
+    mini_stream = bytearray()
+    mini_fat = []
+    starts = {}
+    for index, (_, kind, _, data) in enumerate(entries):
+        if kind == 2 and 0 < len(data) < MINI_STREAM_CUTOFF:
+            sectors = -(-len(data) // MINI_SECTOR_SIZE)
+            starts[index] = len(mini_fat)
+            mini_fat += list(range(len(mini_fat) + 1, len(mini_fat) + sectors)) + [ENDOFCHAIN]
+            mini_stream += data.ljust(sectors * MINI_SECTOR_SIZE, b"\0")
+
+    sectors = []  # Contenu des secteurs (hors FAT)
+    fat = []
+
+    def allocate(data):
+        if not data:
+            return ENDOFCHAIN
+        start = len(sectors)
+        count = -(-len(data) // SECTOR_SIZE)
+        for i in range(count):
+            sectors.append(data[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE].ljust(SECTOR_SIZE, b"\0"))
+        fat.extend(list(range(start + 1, start + count)) + [ENDOFCHAIN])
+        return start
+
+    for index, (_, kind, _, data) in enumerate(entries):
+        if kind == 2 and len(data) >= MINI_STREAM_CUTOFF:
+            starts[index] = allocate(data)
+    starts[0] = allocate(bytes(mini_stream))
+    mini_fat_data = b"".join(struct.pack("<I", value) for value in mini_fat)
+    mini_fat_start = allocate(mini_fat_data)
+
+    def directory_entry(index):
+        name, kind, children, data = entries[index]
+        encoded = (name + "\0").encode("utf-16-le")
+        siblings = {}  # Frères chaînés par le lien droit
+        for parent in entries:
+            for position, child in enumerate(parent[2]):
+                if child == index and position + 1 < len(parent[2]):
+                    siblings["right"] = parent[2][position + 1]
+        size = len(mini_stream) if kind == 5 else len(data) if kind == 2 else 0
+        start = starts.get(index, ENDOFCHAIN) if size else (ENDOFCHAIN if kind != 1 else 0)
+        return struct.pack(
+            "<64sHBBIII16sIQQIQ",
+            encoded, len(encoded), kind, 1, NOSTREAM, siblings.get("right", NOSTREAM),
+            children[0] if children else NOSTREAM, b"\0" * 16, 0, 0, 0, start, size,
+        )
+
+    directory = b"".join(directory_entry(index) for index in range(len(entries)))
+    # Entrées inutilisées en fin de secteur
+    unused = struct.pack("<64sHBBIII16sIQQIQ", b"", 0, 0, 0, NOSTREAM, NOSTREAM, NOSTREAM, b"\0" * 16, 0, 0, 0, 0, 0)
+    directory += unused * (-len(entries) % (SECTOR_SIZE // 128))
+    directory_start = allocate(directory)
+
+    # Secteurs de la FAT : ils se décrivent eux-mêmes
+    fat_sectors = 1
+    while (len(sectors) + fat_sectors) > fat_sectors * (SECTOR_SIZE // 4):
+        fat_sectors += 1
+    if fat_sectors > 109:
+        raise ValueError("Fichier trop volumineux pour un en-tête sans secteurs DIFAT")
+    fat_start = len(sectors)
+    fat += [FATSECT] * fat_sectors
+    fat += [FREESECT] * (fat_sectors * (SECTOR_SIZE // 4) - len(fat))
+    fat_data = b"".join(struct.pack("<I", value) for value in fat)
+
+    difat = [fat_start + i for i in range(fat_sectors)] + [FREESECT] * (109 - fat_sectors)
+    header = struct.pack(
+        "<8s16sHHHHH6sIIIIIIIII",
+        bytes.fromhex("D0CF11E0A1B11AE1"), b"\0" * 16, 0x3E, 3, 0xFFFE, 9, 6, b"\0" * 6,
+        0, fat_sectors, directory_start, 0, MINI_STREAM_CUTOFF,
+        mini_fat_start if mini_fat else ENDOFCHAIN, -(-len(mini_fat_data) // SECTOR_SIZE), ENDOFCHAIN, 0,
+    ) + struct.pack("<109I", *difat)
+    return header + b"".join(sectors) + fat_data
+
+
+PT_LONG, PT_SYSTIME, PT_UNICODE, PT_BINARY = 0x0003, 0x0040, 0x001F, 0x0102
+
+
+def _filetime(date):
+    return int((date - datetime.datetime(1601, 1, 1, tzinfo=datetime.timezone.utc)).total_seconds() * 10**7)
+
+
+def _properties(header, fixed, variable):
+    """Flux __properties_version1.0 : valeurs fixes en ligne, tailles des valeurs variables (flux __substg1.0)."""
+    data = bytearray(header)
+    for tag, value in fixed:
+        data += struct.pack("<IIQ", tag, 6, value)
+    for tag, value in variable:
+        data += struct.pack("<IIII", tag, 6, len(value) + (2 if tag & 0xFFFF == PT_UNICODE else 0), 0)
+    return bytes(data)
+
+
+def _substg(tag):
+    return f"__substg1.0_{tag:08X}"
+
+
+def make_msg(subject, body, date, attachment_name, attachment_data):
+    """Mail Outlook (.msg) avec une pièce jointe."""
+    strings = [
+        (0x001A0000 | PT_UNICODE, "IPM.Note".encode("utf-16-le")),
+        (0x00370000 | PT_UNICODE, subject.encode("utf-16-le")),
+        (0x10000000 | PT_UNICODE, body.encode("utf-16-le")),
+        (0x0C1A0000 | PT_UNICODE, "LinkedIn".encode("utf-16-le")),
+        (0x0C1F0000 | PT_UNICODE, "jobs-noreply@linkedin.com".encode("utf-16-le")),
+    ]
+    fixed = [(0x00390000 | PT_SYSTIME, _filetime(date)), (0x0E060000 | PT_SYSTIME, _filetime(date))]
+    attachment_strings = [
+        (0x37070000 | PT_UNICODE, attachment_name.encode("utf-16-le")),
+        (0x37040000 | PT_UNICODE, attachment_name.encode("utf-16-le")),
+        (0x37010000 | PT_BINARY, attachment_data),
+    ]
+    attachment = {_substg(tag): value for tag, value in attachment_strings}
+    attachment["__properties_version1.0"] = _properties(
+        b"\0" * 8, [(0x37050000 | PT_LONG, 1), (0x0E200000 | PT_LONG, len(attachment_data))], attachment_strings
+    )
+
+    tree = {_substg(tag): value for tag, value in strings}
+    tree["__properties_version1.0"] = _properties(struct.pack("<8xIIII8x", 0, 1, 0, 1), fixed, strings)
+    tree["__nameid_version1.0"] = {
+        "__substg1.0_00020102": b"", "__substg1.0_00030102": b"", "__substg1.0_00040102": b"",
+    }
+    tree["__attach_version1.0_#00000000"] = attachment
+    return write_cfb(tree)
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+
+def linkedin_body(name, title, city):
+    """Corps du mail de candidature LinkedIn : le titre et l'adresse sont les 4e et 5e éléments."""
+    return "\t\r\n".join([
+        "Votre offre a reçu une nouvelle candidature", name, "Candidature via LinkedIn",
+        title, city, "Voir le profil complet", "",
+    ])
+
+
+def generate_application(rng, index):
+    """Une candidature : (nom du fichier .msg, contenu, description) ."""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    job = rng.choice(JOBS)
+    size = rng.choice(list(SIZES))
+    kind = rng.choices([kind for kind, _ in ATTACHMENT_KINDS], [weight for _, weight in ATTACHMENT_KINDS])[0]
+    header, sections = cv_content(rng, name, size)
+
+    if kind == "docx":
+        attachment_name, data = f"CV_{name.replace(' ', '_')}.docx", make_docx(header, sections)
+    else:
+        maker = make_pdf if kind == "pdf" else make_image_pdf
+        attachment_name, data = f"CV_{name.replace(' ', '_')}.pdf", maker(header, sections)
+
+    title = rng.choice(TITLES).format(rng.choice(COMPANIES))
+    city = f"{rng.choice(CITIES)[0]}, France"
+    date = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(minutes=rng.randint(0, 525_600))
+    subject = f"Nouvelle candidature pour {job}"
+    msg = make_msg(subject, linkedin_body(name, title, city), date, attachment_name, data)
+    # Numéro en tête du nom : la partie après "from" reste le seul nom du candidat, comme dans les vrais mails
+    filename = f"{index:04d} Your job application_ {job} from {name}.msg"
+    return filename, msg, {"kind": kind, "size": size, "attachment_bytes": len(data)}
+
+
+def generate(folder, count, seed=0):
+    """Écrit `count` candidatures dans `folder`. Retourne la description de chaque fichier."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = {}
+    for index in range(count):
+        filename, msg, description = generate_application(rng, index)
+        with open(os.path.join(folder, filename), "wb") as f:
+            f.write(msg)
+        manifest[filename] = description
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="Dossier de sortie")
+    parser.add_argument("--count", type=int, default=60, help="Nombre de candidatures")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = generate(args.folder, args.count, args.seed)
+    kinds = {}
+    for description in manifest.values():
+        kinds[description["kind"]] = kinds.get(description["kind"], 0) + 1
+    print(f"{len(manifest)} candidatures écrites dans {args.folder} : {kinds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Stockage des CV hors des documents de candidature.
+
+Les fichiers sont stockés une seule fois dans la collection `cv_blobs`, sous leur empreinte SHA-256 :
+un candidat qui postule à plusieurs offres avec le même CV partage la même copie. Les candidatures
+ne contiennent qu'une référence (`CV_ref`) et le fichier n'est chargé qu'à la demande.
+
+Le module peut être lancé pour migrer les CV encore intégrés aux candidatures
+(`python -m blobs migrate`) ou supprimer les fichiers qui ne sont plus référencés (`python -m blobs purge`).
+"""
+import argparse
+import datetime
+import hashlib
+import logging
+from bson import Binary
+from pymongo import UpdateOne
+from codec import decode, encode
+from config import collection, blob_collection
+
+
+def blob_ref(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_blobs(files):
+    """
+    Enregistre les fichiers (une seule copie par contenu) et retourne leurs références, dans le même ordre.
+    """
+    refs = [blob_ref(data) for data in files]
+    operations = {
+        ref: UpdateOne(
+            {"_id": ref},
+            {"$setOnInsert": {
+                "data": Binary(encode(data)),  # Compressé, voir codec.py
+                "size": len(data),
+                "created_at": datetime.datetime.now(datetime.timezone.utc),
+            }},
+            upsert=True,
+        )
+        for ref, data in zip(refs, files)
+    }
+    if operations:
+        blob_collection.bulk_write(list(operations.values()), ordered=False)
+    return refs
+
+
+def load_blob(ref):
+    """Contenu du fichier référencé par `ref`, ou None."""
+    blob = blob_collection.find_one({"_id": ref}, {"data": 1})
+    return decode(blob["data"]) if blob else None
+
+
+def load_cv(candidate):
+    """CV d'une candidature : via sa référence, ou intégré au document (ancien format)."""
+    if candidate.get("CV_ref"):
+        return load_blob(candidate["CV_ref"])
+    if candidate.get("CV"):
+        return decode(candidate["CV"])
+    return None
+
+
+def migrate_embedded_cvs(batch_size=50):
+    """Déplace les CV intégrés aux candidatures vers `cv_blobs`. Retourne le nombre de candidatures migrées."""
+    migrated = 0
+    while True:
+        # Les documents migrés n'ont plus de champ CV : on repart toujours du début
+        batch = list(collection.find({"CV": {"$type": "binData"}}, {"CV": 1}).limit(batch_size))
+        if not batch:
+            return migrated
+        refs = store_blobs([bytes(candidate["CV"]) for candidate in batch])
+        collection.bulk_write(
+            [
+                UpdateOne({"_id": candidate["_id"]}, {"$set": {"CV_ref": ref}, "$unset": {"CV": ""}})
+                for candidate, ref in zip(batch, refs)
+            ],
+            ordered=False,
+        )
+        migrated += len(batch)
+        logging.info(f"{migrated} CV migré(s)...")
+
+
+def purge_orphans():
+    """Supprime les fichiers qui ne sont plus référencés par aucune candidature."""
+    referenced = set(collection.distinct("CV_ref"))
+    orphans = [blob["_id"] for blob in blob_collection.find({}, {"_id": 1}) if blob["_id"] not in referenced]
+    if orphans:
+        blob_collection.delete_many({"_id": {"$in": orphans}})
+    return len(orphans)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestion du stockage des CV")
+    parser.add_argument("command", choices=["migrate", "purge"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "migrate":
+        print(f"{migrate_embedded_cvs()} CV déplacé(s) vers cv_blobs.")
+    else:
+        print(f"{purge_orphans()} fichier(s) orphelin(s) supprimé(s).")
@@ -0,0 +1,66 @@
+"""
+Caches des requêtes de lecture sur la collection des candidatures.
+
+Les résultats sont mis en cache par Streamlit (partagés entre les sessions du processus) et
+indexés par une version de la collection, incrémentée à chaque écriture via `invalidate()` :
+toute écriture rend donc les entrées existantes obsolètes. Le TTL couvre les écritures
+faites par un autre processus.
+"""
+import threading
+import streamlit as st
+from bson import json_util
+from config import collection
+from indexes import FR_COLLATION
+import metrics
+
+_version = 0
+_version_lock = threading.Lock()
+
+
+def data_version():
+    return _version
+
+
+def invalidate():
+    """À appeler après toute écriture sur la collection des candidatures."""
+    global _version
+    with _version_lock:
+        _version += 1
+
+
+def filters_signature(filters):
+    """Représentation canonique (et hachable) d'un filtre MongoDB."""
+    return json_util.dumps(filters, sort_keys=True)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _count_documents(signature, version):
+    with metrics.span("mongo.count_applications"):
+        return collection.count_documents(json_util.loads(signature), collation=FR_COLLATION)
+
+
+def count_applications(filters):
+    """Nombre de candidatures correspondant aux filtres, mis en cache par signature de filtre."""
+    return _count_documents(filters_signature(filters), data_version())
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _distinct_jobs(version):
+    return collection.distinct("Job")
+
+
+def job_list():
+    """Liste des jobs distincts (sélecteur de job)."""
+    return _distinct_jobs(data_version())
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _column_keys(version, hidden_fields):
+    # Projection excluant le CV : on ne rapatrie jamais le binaire pour lire les noms de champs
+    document = collection.find_one({}, {field: 0 for field in hidden_fields})
+    return [key for key in document.keys() if key not in hidden_fields] if document else []
+
+
+def column_keys(hidden_fields=()):
+    """Noms des champs d'une candidature, hors champs masqués (sélecteur de tri)."""
+    return _column_keys(data_version(), tuple(hidden_fields))
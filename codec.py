@@ -0,0 +1,49 @@
+"""
+Compression transparente des fichiers stockés dans MongoDB.
+
+Chaque contenu encodé commence par un octet d'en-tête indiquant le codec utilisé.
+Les contenus enregistrés avant l'introduction du codec (PDF commençant par "%PDF",
+DOCX par "PK", DOC par 0xD0) n'ont pas d'en-tête et sont relus tels quels.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Dépendance de requirements.txt ; sans elle, les contenus sont écrits avec zlib
+    zstandard = None
+
+RAW = 0x00
+ZLIB = 0x01
+ZSTD = 0x02
+
+
+def encode(data, level=None):
+    """
+    Compresse `data` avec zstd si disponible, sinon zlib. Le contenu est stocké sans compression
+    si celle-ci ne fait pas gagner de place (PDF déjà compressés par exemple).
+    """
+    if zstandard is not None:
+        header, compressed = ZSTD, zstandard.ZstdCompressor(level=level or 10).compress(data)
+    else:
+        header, compressed = ZLIB, zlib.compress(data, level or 6)
+
+    if len(compressed) >= len(data):
+        return bytes([RAW]) + data
+    return bytes([header]) + compressed
+
+
+def decode(payload):
+    """Décompresse un contenu produit par `encode` (ou retourne tel quel un contenu sans en-tête)."""
+    payload = bytes(payload)
+    if not payload:
+        return payload
+    header = payload[0]
+    if header == RAW:
+        return payload[1:]
+    if header == ZLIB:
+        return zlib.decompress(payload[1:])
+    if header == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Contenu compressé avec zstd : installez le paquet `zstandard` pour le lire.")
+        return zstandard.ZstdDecompressor().decompress(payload[1:])
+    return payload  # Ancien format, non compressé
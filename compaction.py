@@ -0,0 +1,109 @@
+"""
+Compaction du texte anonymisé des CV avant l'appel au LLM.
+
+Le texte extrait contient beaucoup de bruit : en-têtes et pieds de page répétés sur chaque page,
+cellules fusionnées des tableaux Word (répétées dans chaque colonne), espaces multiples, numéros
+de page... Ce bruit coûte des tokens (quota TPM) et du temps de réponse sans rien apporter à
+l'extraction. Au-delà du budget de tokens, les sections les moins utiles (centres d'intérêt,
+références...) sont retirées en premier ; la formation et l'expérience sont toujours conservées.
+"""
+import re
+import unicodedata
+from rate_limit import estimate_tokens
+
+WHITESPACE_PATTERN = re.compile(r"[ \t\xa0\u200b]+")
+# Lignes sans information : numéros de page, séparateurs
+NOISE_LINE_PATTERN = re.compile(r"^(?:page\s*)?\d{1,3}(?:\s*(?:/|sur)\s*\d{1,3})?$|^[\W_]+$", re.IGNORECASE)
+
+# Titres de section (sans accents, en minuscules) et priorité : les sections de priorité 0 sont retirées
+# en premier, celles de priorité 2 ne sont jamais retirées
+SECTION_PRIORITIES = {
+    "formation": 2, "formations": 2, "education": 2, "diplome": 2, "diplomes": 2, "etudes": 2, "cursus": 2,
+    "experience": 2, "experiences": 2, "experience professionnelle": 2, "experiences professionnelles": 2,
+    "parcours": 2, "parcours professionnel": 2, "work experience": 2, "professional experience": 2,
+    # Les compétences techniques sont extraites par le LLM : jamais retirées
+    "competences": 2, "competences techniques": 2, "skills": 2, "technical skills": 2, "outils": 2,
+    "certifications": 1, "projets": 1, "projects": 1, "langues": 1, "languages": 1,
+    "centres d'interet": 0, "centres d interet": 0, "centre d'interet": 0, "interets": 0, "interests": 0,
+    "loisirs": 0, "hobbies": 0, "activites": 0, "activites extra-professionnelles": 0, "benevolat": 0,
+    "references": 0, "divers": 0, "informations complementaires": 0,
+}
+DEFAULT_PRIORITY = 1
+MAX_HEADING_LENGTH = 40
+# Les lignes courtes répétées ("Stage", "CDI", "Paris") portent de l'information : seules les lignes
+# plus longues (en-têtes, pieds de page) sont dédupliquées
+MIN_DUPLICATE_LENGTH = 25
+
+
+def _key(line):
+    """Forme normalisée d'une ligne (sans accents, minuscules), pour comparer les lignes entre elles."""
+    line = unicodedata.normalize("NFKD", line).encode("ascii", "ignore").decode()
+    return line.lower().strip(" :-•·|")
+
+
+def clean_lines(text):
+    """
+    Découpe le texte en lignes, réduit les espaces, retire les cellules répétées d'une même ligne
+    (cellules fusionnées), les lignes sans information et les lignes déjà vues (en-têtes, pieds de page).
+    """
+    seen = set()
+    lines = []
+    for raw_line in text.splitlines():
+        cells = []
+        for cell in raw_line.split("\t"):
+            cell = WHITESPACE_PATTERN.sub(" ", cell).strip()
+            if cell and cell not in cells:
+                cells.append(cell)
+        line = " ".join(cells)
+        key = _key(line)
+        if not key or NOISE_LINE_PATTERN.match(line) or key in seen:
+            continue
+        if len(key) >= MIN_DUPLICATE_LENGTH:
+            seen.add(key)
+        lines.append(line)
+    return lines
+
+
+def split_sections(lines):
+    """Découpe les lignes en sections [(priorité, lignes)], d'après les titres de section reconnus."""
+    sections = [(2, [])]  # En-tête du CV (titre, résumé) avant la première section, toujours conservé
+    for line in lines:
+        key = _key(line)
+        if len(line) <= MAX_HEADING_LENGTH and key in SECTION_PRIORITIES:
+            sections.append((SECTION_PRIORITIES[key], [line]))
+        else:
+            sections[-1][1].append(line)
+    return sections
+
+
+def count_tokens(text):
+    return estimate_tokens(text, output_tokens=0)
+
+
+def compact_cv(text, max_tokens):
+    """
+    Compacte le texte d'un CV et le ramène si possible sous `max_tokens` tokens.
+
+    Au-delà du budget, les sections sont retirées par priorité croissante, en commençant par la fin
+    du CV ; l'en-tête et les sections de formation, d'expérience et de compétences sont conservés. Le texte n'est
+    tronqué que s'ils dépassent à eux seuls le budget.
+
+    Returns:
+        tuple: Le texte compacté et le nombre de tokens estimé avant et après compaction ({"before", "after"}).
+    """
+    sections = split_sections(clean_lines(text))
+
+    def size():
+        return sum(count_tokens("\n".join(lines)) for _, lines in sections)
+
+    for priority in (0, 1):
+        for index in reversed(range(len(sections))):
+            if size() <= max_tokens:
+                break
+            if sections[index][0] == priority:
+                del sections[index]
+
+    compacted = "\n".join(line for _, lines in sections for line in lines)
+    if count_tokens(compacted) > max_tokens:
+        compacted = compacted[:max_tokens * 4].rsplit("\n", 1)[0]
+    return compacted, {"before": count_tokens(text), "after": count_tokens(compacted)}
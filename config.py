@@ -1,5 +1,5 @@
-from pymongo import MongoClient
-import google.generativeai as genai
+import os
+import streamlit as st
 
 # Staging
 
@@ -14,10 +14,80 @@ import google.generativeai as genai
 
 # Production
 
-import streamlit as st
-api_key = st.secrets["GOOGLE_API_KEY"]
-genai.configure(api_key=api_key)
-MONGO_URI = st.secrets["MONGO_URI"]
-client = MongoClient(MONGO_URI)
-db = client["ats_database"]
-collection = db["candidatures"]
\ No newline at end of file
+# Les clients MongoDB et Gemini ne sont créés qu'à la première utilisation (l'écran de connexion
+# s'affiche sans eux), puis partagés par toutes les sessions du processus.
+# Les collections s'importent comme des attributs du module : `from config import collection`.
+COLLECTIONS = {
+    "collection": "candidatures",
+    "cache_collection": "llm_cache",
+    "blob_collection": "cv_blobs",  # Fichiers des CV, dédupliqués par empreinte SHA-256
+    "jobs_collection": "jobs",  # File d'attente des imports
+    "job_items_collection": "job_items",
+    "journal_collection": "ingest_journal",  # Mails déjà importés, par empreinte du .msg
+    "metrics_collection": "metrics",  # Durée des étapes de l'import et des requêtes (voir metrics.py)
+    "quota_collection": "llm_quota",  # Quota de l'API partagé par tous les processus (voir rate_limit.py)
+}
+
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    from pymongo import MongoClient
+    return MongoClient(st.secrets["MONGO_URI"])
+
+
+@st.cache_resource(show_spinner=False)
+def get_db():
+    from indexes import ensure_indexes, INDEXES, JOB_ITEM_INDEXES, METRIC_INDEXES
+    db = get_client()["ats_database"]
+
+    # Création des index (une fois par processus)
+    ensure_indexes(db[COLLECTIONS["collection"]], INDEXES)
+    ensure_indexes(db[COLLECTIONS["job_items_collection"]], JOB_ITEM_INDEXES)
+    ensure_indexes(db[COLLECTIONS["metrics_collection"]], METRIC_INDEXES)
+
+    # Candidatures importées avant la recherche indexée
+    from search import reindex_missing
+    reindex_missing(db[COLLECTIONS["collection"]])
+    return db
+
+
+@st.cache_resource(show_spinner=False)
+def get_genai():
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+    return genai
+
+
+def __getattr__(name):
+    if name in COLLECTIONS:
+        return get_db()[COLLECTIONS[name]]
+    if name == "db":
+        return get_db()
+    if name == "genai":
+        return get_genai()
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
+
+
+# Modèle et quotas de l'API Gemini (offre gratuite)
+GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_RPM = 15
+GEMINI_TPM = 1_000_000
+GEMINI_MAX_WORKERS = 5
+
+# Backend d'appel au LLM : "gemini", ou un LLM factice pour les tests de charge (voir llm_backends.py)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+
+# Plusieurs CV par requête : le quota limitant est le nombre de requêtes par minute.
+# 60 000 tokens par requête maximum, pour que 15 requêtes par minute restent sous le quota de tokens.
+GEMINI_PACK_SIZE = 8
+GEMINI_PACK_MAX_TOKENS = 60_000
+
+# Budget de tokens du texte d'un CV envoyé au LLM, après compaction
+CV_TOKEN_BUDGET = 2_500
+
+# Nombre maximum de CV par archive zip : l'archive est construite en mémoire avant d'être envoyée au navigateur
+ZIP_MAX_CVS = 50
+
+# Cache des extractions du LLM
+LLM_CACHE_TTL_DAYS = 90
+LLM_CACHE_MAX_ENTRIES = 50_000
@@ -0,0 +1,55 @@
+"""
+Téléchargement des CV à la demande.
+
+Les fichiers sont lus dans MongoDB uniquement au moment où l'utilisateur demande le téléchargement,
+un par un. L'archive de plusieurs candidats est en revanche écrite en mémoire (le bouton de téléchargement
+de Streamlit envoie un contenu complet) : sa taille est bornée par ZIP_MAX_CVS (voir config.py).
+"""
+import re
+import zipfile
+from config import collection
+from blobs import load_blob, load_cv
+from utils import cv_file_info
+
+
+def safe_filename(*parts):
+    """Nom de fichier sans caractères problématiques, construit à partir de `parts`."""
+    name = "_".join(str(part) for part in parts if part)
+    return re.sub(r"[^\w\-. ]+", "", name).strip().replace(" ", "_") or "cv"
+
+
+def iter_cvs(candidate_ids):
+    """
+    Itère sur (nom de fichier, type MIME, contenu) des CV des candidats demandés,
+    en chargeant chaque fichier au dernier moment.
+    """
+    # Les documents sont lus sans le CV intégré (ancien format), chargé ensuite un par un
+    for candidate in collection.find({"_id": {"$in": candidate_ids}}, {"Nom": 1, "Job": 1, "CV_ref": 1}):
+        if candidate.get("CV_ref"):
+            cv = load_blob(candidate["CV_ref"])
+        else:
+            cv = load_cv(collection.find_one({"_id": candidate["_id"]}, {"CV": 1}) or {})
+        if cv:
+            filename, mime_type = cv_file_info(cv, safe_filename(candidate.get("Nom"), candidate.get("Job")))
+            yield filename, mime_type, cv
+
+
+def write_cv_zip(candidate_ids, fileobj):
+    """
+    Écrit dans `fileobj` une archive zip des CV des candidats demandés.
+    Retourne le nombre de CV ajoutés.
+    """
+    count = 0
+    names = set()
+    # Les PDF et DOCX sont déjà compressés : on les stocke tels quels dans l'archive
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED) as archive:
+        for filename, _, cv in iter_cvs(candidate_ids):
+            stem, _, extension = filename.rpartition(".")
+            suffix = 1
+            while filename in names:  # Même candidat sur plusieurs offres
+                suffix += 1
+                filename = f"{stem}_{suffix}.{extension}"
+            names.add(filename)
+            archive.writestr(filename, cv)
+            count += 1
+    return count
@@ -1,68 +1,186 @@
+import io
+import numbers
 from bson import ObjectId
+from pymongo import UpdateOne
 import streamlit as st
 import pandas as pd
-from config import collection
+from config import collection, ZIP_MAX_CVS
+from indexes import FR_COLLATION
+from cache import column_keys, count_applications, filters_signature, invalidate, job_list
+from blobs import load_cv
+from downloads import safe_filename, write_cv_zip
+from utils import cv_file_info
+from search import SEARCHABLE_FIELDS, build_search_tokens, relevance_score, search_filter
+import metrics
 from st_aggrid import AgGrid, GridOptionsBuilder
 from streamlit_pdf_viewer import pdf_viewer
 
 @st.dialog("Fiche candidat")
 def open_fiche_candidat(candidate_id):
     """Load and diaplay Resume from MongoDB"""
-    candidate = collection.find_one({"_id": ObjectId(candidate_id)}, {"CV": 1, "Nom": 1, "Job": 1})
+    with metrics.span("mongo.find_candidate"):
+        candidate = collection.find_one(
+            {"_id": ObjectId(candidate_id)}, {"CV": 1, "CV_ref": 1, "Nom": 1, "Job": 1, "identity_id": 1}
+        )
 
     if candidate:
         col1, col2 = st.columns([2, 1])  # Largeur : 2/3 pour le PDF, 1/3 pour le texte
         with col1:
-            if "CV" in candidate and candidate["CV"]:
-                pdf_viewer(candidate["CV"], width="100%")
+            cv = load_cv(candidate)  # Chargé à la demande depuis cv_blobs
+            if cv:
+                filename, mime_type = cv_file_info(cv, safe_filename(candidate["Nom"], candidate["Job"]))
+                st.download_button("⬇️ Télécharger le CV", data=cv, file_name=filename, mime=mime_type)
+                pdf_viewer(cv, width="100%")
             else:
                 st.warning("Aucun CV disponible pour ce candidat.")
         with col2:
             st.subheader("Ici on pourrait afficher et éditer des infos sur le candidat")
             st.write("On pourrait également naviguer entre les fiches avec des flèches")
-            st.write("Vue candidat 360 directement ici ? avec la liste des candidatures")
 
             st.write(f"**Nom :** {candidate["Nom"]}")
             st.write(f"**Job :** {candidate["Job"]}")
+
+            # Candidatures de la même personne sur d'autres jobs (voir identities.py)
+            if candidate.get("identity_id"):
+                with metrics.span("mongo.find_identity"):
+                    others = list(collection.find(
+                        {"identity_id": candidate["identity_id"], "_id": {"$ne": candidate["_id"]}},
+                        {"Job": 1, "Nom": 1},
+                    ).limit(20))
+                if others:
+                    st.write("**Autres candidatures :**")
+                    for other in others:
+                        st.write(f"- {other["Job"]} ({other["Nom"]})")
             # Ajoute ici d'autres infos utiles
 
     else:
         st.error("Impossible de récupérer le CV.")
 
+# Champs techniques jamais affichés dans la grille
+HIDDEN_FIELDS = ["CV", "CV_ref", "search_tokens", "dedup", "identity_id", "llm_response"]
+
+# Champs toujours renseignés et d'un seul type BSON : $gt/$lt ne comparent que des valeurs de même type,
+# un tri sur un autre champ (Mail, Téléphone à None, Diplôme texte ou nombre...) est paginé par skip
+KEYSET_FIELDS = {"_id", "Date", "Statut", "Expérience"}
+
+def sort_spec(sort_columns=None, sort_orders=None):
+    """
+    Sort criteria for the given columns, with _id as a tiebreaker so that the order is total
+    (required by keyset pagination).
+    """
+    spec = []
+    if sort_columns and sort_orders:
+        spec = [(col, 1 if asc else -1) for col, asc in zip(sort_columns, sort_orders)]
+    if "_id" not in (col for col, _ in spec):
+        spec.append(("_id", 1))
+    return spec
+
+def page_key(document, spec):
+    """
+    Values of the sort keys of a document, used as a keyset pagination boundary.
+    Returns None if a sort key is not in KEYSET_FIELDS or a value is missing (it could not be
+    compared with $gt/$lt), in which case the neighbouring pages are loaded with skip.
+    """
+    if any(col not in KEYSET_FIELDS for col, _ in spec):
+        return None
+    key = [document.get(col) for col, _ in spec]
+    if any(value is None or (isinstance(value, float) and pd.isna(value)) for value in key):
+        return None
+    return key
+
+def keyset_filter(spec, key):
+    """
+    Filter selecting the documents located strictly after `key` in the `spec` order:
+    (k1 > v1) or (k1 = v1 and k2 > v2) or ...
+
+    Null or missing values sort before every other value: in descending order they come after `key`,
+    but $lt does not match them (no comparison across types), so they are selected explicitly.
+    """
+    clauses = []
+    for i, (col, direction) in enumerate(spec):
+        prefix = {prev_col: key[j] for j, (prev_col, _) in enumerate(spec[:i])}
+        clauses.append({**prefix, col: {"$gt" if direction == 1 else "$lt": key[i]}})
+        if direction == -1:
+            clauses.append({**prefix, col: None})
+    return {"$or": clauses}
+
 # @st.cache_data(ttl=60)
-def load_data(skip, limit, filters, sort_columns, sort_orders):
-    return get_applications(skip, limit, filters, sort_columns, sort_orders)
+def load_data(limit, filters, sort_columns, sort_orders, ranking=None, skip=0, after=None, before=None, from_end=False):
+    return fetch_applications(limit, filters, sort_columns, sort_orders, ranking, skip, after, before, from_end)
 
-def get_applications(skip=0, limit=20, filters=None, sort_columns=None, sort_orders=None):
+def applications_cursor(filters=None, sort_columns=None, sort_orders=None, reverse=False):
     """
-    Retrieve applications from the MongoDB database with pagination, filters, and sorting.
+    Build the MongoDB cursor used by get_applications (also checked with explain() by `python -m indexes`).
     """
     query = {}
     if filters:
         query.update(filters)
 
-    projection = {"CV": 0}  # Exclure le champ CV
+    projection = {field: 0 for field in HIDDEN_FIELDS}  # Exclure le CV et les champs techniques
 
-    sort_criteria = []
-    if sort_columns and sort_orders:
-        sort_criteria = [(col, 1 if asc else -1) for col, asc in zip(sort_columns, sort_orders)]
-
-    if sort_criteria:
-        app_list = list(
-            collection.find(query, projection)
-            .collation({"locale": "fr", "strength": 1})
-            .sort(sort_criteria)
-            .skip(skip)
-            .limit(limit)
-        )
-    else:
-        app_list = list(
-            collection.find(query, projection)
-            .collation({"locale": "fr", "strength": 1})
-            .skip(skip)
-            .limit(limit)
+    spec = sort_spec(sort_columns, sort_orders)
+    if reverse:
+        spec = [(col, -direction) for col, direction in spec]
+
+    return collection.find(query, projection).collation(FR_COLLATION).sort(spec)
+
+@metrics.timed("mongo.ranked_applications")
+def ranked_applications(skip, limit, filters, ranking):
+    """
+    Retrieve applications matching a full-text search, ordered by relevance (see search.relevance_score).
+    """
+    if not ranking:
+        return fetch_applications(limit, filters, skip=skip)
+    pipeline = [
+        {"$match": filters or {}},
+        {"$addFields": {"score": ranking}},
+        {"$sort": {"score": -1, "_id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {field: 0 for field in HIDDEN_FIELDS + ["score"]}},
+    ]
+    return list(collection.aggregate(pipeline, collation=FR_COLLATION))
+
+def fetch_applications(limit=20, filters=None, sort_columns=None, sort_orders=None, ranking=None,
+                       skip=0, after=None, before=None, from_end=False):
+    """
+    Retrieve a page of raw application documents.
+
+    Pages are located by keyset when possible: `after` (resp. `before`) is the sort key of the last
+    (resp. first) document of the neighbouring page, and `from_end` loads the last `limit` documents.
+    Otherwise `skip` is used (jump to an arbitrary page, or relevance-ranked search results).
+    """
+    if ranking and not sort_columns:
+        return ranked_applications(skip, limit, filters, ranking)
+
+    spec = sort_spec(sort_columns, sort_orders)
+    query = dict(filters or {})
+    if after is not None or before is not None:
+        boundary = keyset_filter(spec, after) if after is not None else keyset_filter(
+            [(col, -direction) for col, direction in spec], before
         )
+        query = {"$and": [query, boundary]} if query else boundary
+
+    reverse = before is not None or from_end
+    cursor = applications_cursor(query, sort_columns, sort_orders, reverse=reverse)
+    if after is None and before is None and not from_end:
+        cursor = cursor.skip(skip)
+    with metrics.span("mongo.find_applications", keyset=after is not None or before is not None, skip=skip) as span:
+        app_list = list(cursor.limit(limit))
+        span.set(rows=len(app_list))
+    return app_list[::-1] if reverse else app_list
+
+def get_applications(skip=0, limit=20, filters=None, sort_columns=None, sort_orders=None, ranking=None):
+    """
+    Retrieve applications from the MongoDB database with pagination, filters, and sorting.
+    Without sort columns, a relevance `ranking` expression orders the results of a full-text search.
+    """
+    return applications_dataframe(fetch_applications(limit, filters, sort_columns, sort_orders, ranking, skip))
 
+def applications_dataframe(app_list):
+    """
+    Convert raw application documents into the DataFrame displayed in the grid.
+    """
     if app_list:
         df = pd.DataFrame(app_list)
         df["Téléphone"] = df["Téléphone"].apply(lambda x: str(x) if pd.notna(x) else "")
@@ -72,6 +190,74 @@ def get_applications(skip=0, limit=20, filters=None, sort_columns=None, sort_ord
     return pd.DataFrame()
 
 
+def _normalize(col, value):
+    """Normalize a cell value so that the grid's output can be compared with the stored value."""
+    if isinstance(value, (list, dict)):
+        return str(value)
+    if value is None or (not isinstance(value, str) and pd.isna(value)) or value == "":
+        return None
+    if col == "Date":
+        date = pd.to_datetime(value, errors="coerce")
+        if pd.notna(date) and date.tzinfo is not None:
+            date = date.tz_convert("UTC").tz_localize(None)
+        return date
+    if isinstance(value, numbers.Number):
+        return float(value)
+    return str(value)
+
+def _to_mongo(col, value):
+    """Convert a value edited in the grid into a BSON-compatible value."""
+    value = _normalize(col, value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, float) and value.is_integer() and col == "Statut":
+        return int(value)
+    return value
+
+def diff_rows(app_list, edited_df):
+    """
+    Compare the edited grid with the documents it was loaded from.
+    Returns a list of (document, {field: new value}) for the rows with at least one changed cell.
+    """
+    originals = {str(doc["_id"]): doc for doc in app_list}
+    changes = []
+    for row in edited_df.to_dict("records"):
+        original = originals.get(str(row.get("_id")))
+        if original is None:
+            continue
+        changed = {
+            col: _to_mongo(col, value)
+            for col, value in row.items()
+            if col != "_id" and _normalize(col, value) != _normalize(col, original.get(col))
+        }
+        if changed:
+            changes.append((original, changed))
+    return changes
+
+def save_changes(changes):
+    """
+    Write the changed fields with a single bulk_write of targeted $set operations.
+
+    Each update only applies if the changed fields still hold the values that were loaded
+    (optimistic concurrency): a row modified in the meantime by another user is not overwritten.
+    Returns the number of saved rows and the number of conflicting rows.
+    """
+    operations = []
+    for original, changed in changes:
+        guard = {"_id": original["_id"], **{col: original.get(col) for col in changed}}
+        update = dict(changed)
+        if any(col in SEARCHABLE_FIELDS for col in changed):
+            # Mettre à jour l'index de recherche avec les nouvelles valeurs
+            update["search_tokens"] = build_search_tokens({**original, **changed})
+        operations.append(UpdateOne(guard, {"$set": update}))
+
+    if not operations:
+        return 0, 0
+    with metrics.span("mongo.save_changes", rows=len(operations)):
+        result = collection.bulk_write(operations, ordered=False)
+    invalidate()
+    return result.matched_count, len(operations) - result.matched_count
+
 def gestion_page():
     st.title("Candidatures")
 
@@ -79,7 +265,6 @@ def gestion_page():
         st.session_state.page = 0
 
     page_size = 20
-    skip = st.session_state.page * page_size
 
     STATUT_MAPPING = {
         0: "🟡 Non traité",
@@ -110,7 +295,7 @@ def gestion_page():
     with col3:
         job_filter = st.selectbox(
             "💼 Job",
-            ["Tous"] + collection.distinct("Job"),
+            ["Tous"] + job_list(),
             on_change=lambda: st.session_state.update(page=0),
         )
 
@@ -156,25 +341,62 @@ def gestion_page():
     col_tri, col_search = st.columns(2)
 
     with col_tri:
-        sort_columns = st.multiselect("↕️ Trier par :", collection.find_one().keys(), placeholder = "Choisir une colonne", on_change=lambda: st.session_state.update(page=0))
+        sort_columns = st.multiselect("↕️ Trier par :", column_keys(HIDDEN_FIELDS), placeholder = "Choisir une colonne", on_change=lambda: st.session_state.update(page=0))
         sort_orders = [st.checkbox(f"Ordre croissant pour {col}", value=True, on_change=lambda: st.session_state.update(page=0)) for col in sort_columns]
     
     with col_search:
         col_field, col_query = st.columns([2, 3])
         with col_field:
-            searchable_columns = ["Nom", "Titre LinkedIn", "Compétences Tech", "Entreprises", "Adresse"]
+            searchable_columns = ["Tous les champs"] + list(SEARCHABLE_FIELDS)
             selected_column = st.selectbox("🔍 Rechercher par :", searchable_columns)
         with col_query:
             # Champ de texte pour la recherche
             search_query = st.text_input("Champ de recherche", placeholder="Entrez votre recherche...", label_visibility="hidden")
 
-    # Appliquer le filtre si une recherche est faite
+    # Appliquer le filtre si une recherche est faite (index plein texte, résultats classés par pertinence)
+    ranking = None
     if search_query:
-        filters[selected_column] = {"$regex": search_query, "$options": "i"}
+        search_fields = None if selected_column == "Tous les champs" else [selected_column]
+        filters.update(search_filter(search_query, search_fields))
+        ranking = relevance_score(search_query, search_fields)
 
 
     ### LOADIND DATA
-    df = load_data(skip, page_size, filters, sort_columns, sort_orders)
+
+    # Total mis en cache par signature de filtre, invalidé à chaque écriture
+    TOTAL_DOCS = count_applications(filters)
+    total_pages = (TOTAL_DOCS // page_size) + (1 if TOTAL_DOCS % page_size != 0 else 0)
+
+    # Bornes (clés de tri du premier et du dernier document) des pages déjà chargées,
+    # réinitialisées quand les filtres ou le tri changent
+    spec = sort_spec(sort_columns, sort_orders)
+    query_signature = filters_signature({"filters": filters, "sort": spec, "ranking": ranking})
+    if st.session_state.get("query_signature") != query_signature:
+        st.session_state.query_signature = query_signature
+        st.session_state.page_bounds = {}
+        st.session_state.page = 0
+    page_bounds = st.session_state.page_bounds
+    page = st.session_state.page
+
+    # Pagination par clé (keyset) depuis une page voisine déjà chargée, sinon skip
+    pagination = {}
+    if not ranking and page > 0:
+        if page_bounds.get(page - 1, (None, None))[1] is not None:
+            pagination["after"] = page_bounds[page - 1][1]
+        elif page_bounds.get(page + 1, (None, None))[0] is not None:
+            pagination["before"] = page_bounds[page + 1][0]
+        elif page == total_pages - 1 and TOTAL_DOCS > page * page_size:
+            pagination["from_end"] = True
+    limit = page_size
+    if pagination.get("from_end"):
+        limit = TOTAL_DOCS - page * page_size  # Taille de la dernière page
+    elif not pagination:
+        pagination["skip"] = page * page_size
+
+    app_list = load_data(limit, filters, sort_columns, sort_orders, ranking, **pagination)
+    if app_list:
+        page_bounds[page] = (page_key(app_list[0], spec), page_key(app_list[-1], spec))
+    df = applications_dataframe(app_list)
 
     col_pag1, col_pag2, col_pag3, col_pag4, col_pag5, col_pag6, col_pag7, col_pag8 = (
         st.columns([4, 4, 4, 2, 1, 1, 1, 1])
@@ -197,9 +419,6 @@ def gestion_page():
 
 
     if not df.empty:
- 
-        TOTAL_DOCS = collection.count_documents(filters)  # Calcul unique du total
-        total_pages = (TOTAL_DOCS // page_size) + (1 if TOTAL_DOCS % page_size != 0 else 0)
 
         with col_pag8:  # Last page
             if st.button("⏭️"):
@@ -251,7 +470,9 @@ def gestion_page():
 
                     # Supprimer les documents correspondants dans la base de données
                     if selected_ids:
-                        collection.delete_many({"_id": {"$in": selected_ids}})
+                        with metrics.span("mongo.delete", rows=len(selected_ids)):
+                            collection.delete_many({"_id": {"$in": selected_ids}})
+                        invalidate()
                         st.success(f"{len(selected_ids)} ligne(s) supprimée(s) ✅")
                         # Recharger les données après la suppression
                         st.rerun()
@@ -262,6 +483,21 @@ def gestion_page():
                     candidate_id = sel_row.iloc[0]["_id"]  # Récupération de l'ID du candidat
                     open_fiche_candidat(candidate_id)
 
+        if sel_row is not None and len(sel_row) > 1:
+            with col_pag3:
+                # Les CV ne sont lus dans la base qu'à la demande, un par un ; l'archive est construite en mémoire
+                if len(sel_row) > ZIP_MAX_CVS:
+                    st.caption(f"Archive limitée à {ZIP_MAX_CVS} CV : réduisez la sélection.")
+                elif st.button("📦 Préparer les CV"):
+                    zip_file = io.BytesIO()
+                    count = write_cv_zip([ObjectId(id_str) for id_str in sel_row["_id"]], zip_file)
+                    if count:
+                        st.download_button(
+                            f"⬇️ Télécharger {count} CV (zip)", data=zip_file, file_name="cvs.zip", mime="application/zip"
+                        )
+                    else:
+                        st.warning("Aucun CV disponible pour ces candidats.")
+
 
         edited_df = grid_response["data"]
         edited_df["Statut"] = edited_df["Statut"].map({v: k for k, v in STATUT_MAPPING.items()})
@@ -269,24 +505,23 @@ def gestion_page():
         # Convertir _id en string pour comparaison
         edited_df["_id"] = edited_df["_id"].astype(str)
 
+        # Modifications cellule par cellule par rapport aux documents chargés
+        changes = diff_rows(app_list, edited_df)
+
         with col_pag1:
+            if "save_message" in st.session_state:
+                st.warning(st.session_state.pop("save_message"))
+
             # Vérification des modifications
-            if not edited_df.reset_index(drop=True).astype(str).equals(df.reset_index(drop=True).astype(str)):
+            if changes:
                 if st.button("💾 Enregistrer"):
+                    saved, conflicts = save_changes(changes)
 
-                    # Mise à jour des documents modifiés
-                    for _, row in edited_df.iterrows():
-                        obj_id = ObjectId(row["_id"])  # Convertir en ObjectId
-                        new_data = row.drop("_id").to_dict()  # Retirer l'ID
-
-                        # Vérifier et reconvertir les champs date en datetime
-                        if "Date" in new_data:
-                            new_data["Date"] = pd.to_datetime(new_data["Date"], errors="coerce")  # Gérer les erreurs éventuelles
-
-                        collection.update_one({"_id": obj_id}, {"$set": new_data})
-
-                    # 🔄 Recharger immédiatement les données mises à jour
-                    st.session_state.df = get_applications()
+                    if conflicts:
+                        st.session_state["save_message"] = (
+                            f"{conflicts} ligne(s) non enregistrée(s) : modifiée(s) entre-temps par un autre utilisateur. "
+                            "Les valeurs actuelles ont été rechargées."
+                        )
 
                     # ✅ Redessiner Streamlit sans recharger toute la page
                     st.rerun()
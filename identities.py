@@ -0,0 +1,248 @@
+"""
+Détection des candidatures en double : même personne sur plusieurs jobs, nom écrit différemment
+("Jean-Pierre" / "Jean Pierre"), même CV renvoyé...
+
+Chaque candidature porte un champ `dedup` (empreinte) et un champ `identity_id` commun à toutes les
+candidatures de la même personne. L'empreinte contient des clés de recherche (`dedup.keys`, index multiclé) :
+- l'email et le téléphone extraits du CV, normalisés ;
+- les bandes LSH (locality-sensitive hashing) de la signature MinHash des trigrammes du nom normalisé ;
+- les bandes LSH de la signature MinHash des suites de mots (shingles) du texte anonymisé du CV.
+Deux ensembles proches ont une forte probabilité de partager au moins une bande : une recherche ne lit
+que les candidatures partageant une clé (quel que soit le nombre de candidatures), puis la similarité
+est estimée à partir des signatures.
+
+Le module peut être lancé (`python -m identities`) pour calculer les empreintes des candidatures existantes.
+"""
+import hashlib
+import re
+import struct
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+from search import normalize
+import metrics
+
+# Signatures MinHash de NUM_PERM valeurs, découpées en BANDS bandes de NUM_PERM // BANDS valeurs :
+# deux ensembles de similarité s partagent une bande avec une probabilité 1 - (1 - s^4)^16
+# (environ 50 % pour s = 0,5 et 99,9 % pour s = 0,8)
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3  # Mots par shingle du texte
+
+# Seuils de similarité (Jaccard estimée) : même personne, et même CV (extraction réutilisable)
+NAME_THRESHOLD = 0.6
+NAME_TEXT_THRESHOLD = 0.3
+TEXT_THRESHOLD = 0.8
+REUSE_THRESHOLD = 0.9
+
+# Candidatures lues au plus par recherche (les plus proches sont de toute façon parmi elles)
+MAX_LOOKUP = 50
+
+# Permutations h -> (a * h + b) mod p, tirées une fois pour toutes : les signatures restent comparables
+# d'un processus à l'autre (calcul en entiers 64 bits, comme datasketch)
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_random = np.random.RandomState(1)
+_A = _random.randint(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _random.randint(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+# Champs du candidat remplis par le LLM, et clés correspondantes de sa réponse (pour les candidatures
+# enregistrées sans la réponse brute du LLM, voir `extraction`)
+EXTRACTION_FIELDS = {
+    "Freelance": "Freelance",
+    "Diplôme": "Année de diplomation",
+    "Expérience": "Expérience",
+    "Entreprises": "Entreprises",
+    "Compétences Tech": "Compétences",
+}
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def minhash(shingles):
+    """Signature MinHash d'un ensemble de chaînes (None si l'ensemble est vide)."""
+    hashes = np.fromiter((_hash(shingle) for shingle in shingles), dtype=np.uint64)
+    if not hashes.size:
+        return None
+    with np.errstate(over="ignore"):
+        values = (np.outer(hashes, _A) + _B) % _PRIME & _MAX_HASH
+    return values.min(axis=0).tolist()
+
+
+def similarity(signature, other):
+    """Similarité de Jaccard estimée entre deux ensembles, d'après leurs signatures (0 si l'une manque)."""
+    if not signature or not other:
+        return 0.0
+    return sum(x == y for x, y in zip(signature, other)) / NUM_PERM
+
+
+def lsh_keys(prefix, signature):
+    """Clés des bandes de la signature, préfixées par le type d'empreinte."""
+    if not signature:
+        return []
+    keys = []
+    for band in range(BANDS):
+        rows = struct.pack(f"<{ROWS}I", *signature[band * ROWS:(band + 1) * ROWS])
+        keys.append(f"{prefix}{band}:{hashlib.blake2b(rows, digest_size=8).hexdigest()}")
+    return keys
+
+
+def name_shingles(name):
+    """Trigrammes du nom normalisé : minuscules, sans accents ni tirets, mots triés."""
+    words = [word for word in normalize(name) if word != "inconnu"]
+    if not words:
+        return set()
+    text = f" {' '.join(sorted(words))} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def text_shingles(text):
+    """Suites de SHINGLE_SIZE mots du texte normalisé."""
+    words = normalize(text)
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 0))}
+
+
+def normalize_email(email):
+    email = str(email or "").strip().lower()
+    return email if "@" in email else None
+
+
+def normalize_phone(phone):
+    """Les 9 derniers chiffres du numéro : "+33 6 12..." et "06.12..." donnent la même valeur."""
+    digits = re.sub(r"\D", "", str(phone or ""))
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def fingerprint(candidate, text=""):
+    """Empreinte d'une candidature (à stocker dans `dedup`), d'après le candidat et le texte anonymisé du CV."""
+    email = normalize_email(candidate.get("Mail"))
+    phone = normalize_phone(candidate.get("Téléphone"))
+    name = minhash(name_shingles(candidate.get("Nom", "")))
+    text = minhash(text_shingles(text)) if text else None
+    keys = lsh_keys("n", name) + lsh_keys("t", text)
+    if email:
+        keys.append(f"email:{email}")
+    if phone:
+        keys.append(f"tel:{phone}")
+    return {"keys": keys, "name": name, "text": text, "email": email, "phone": phone}
+
+
+def same_person(dedup, other):
+    """
+    Deux candidatures sont de la même personne si elles ont le même email ou le même téléphone,
+    des CV presque identiques, ou des noms proches et des CV assez semblables.
+    """
+    if dedup["email"] and dedup["email"] == other.get("email"):
+        return True
+    if dedup["phone"] and dedup["phone"] == other.get("phone"):
+        return True
+    text_similarity = similarity(dedup["text"], other.get("text"))
+    return text_similarity >= TEXT_THRESHOLD or (
+        similarity(dedup["name"], other.get("name")) >= NAME_THRESHOLD and text_similarity >= NAME_TEXT_THRESHOLD
+    )
+
+
+def best_match(dedup, documents):
+    """
+    Candidature de la même personne la plus proche parmi `documents` (qui portent `dedup`).
+
+    Returns:
+        tuple: Le document (None si aucun) et la similarité des textes des CV.
+    """
+    best, best_similarity = None, -1.0
+    for document in documents:
+        other = document.get("dedup")
+        if not other or not same_person(dedup, other):
+            continue
+        text_similarity = similarity(dedup["text"], other.get("text"))
+        if text_similarity > best_similarity:
+            best, best_similarity = document, text_similarity
+    return best, max(best_similarity, 0.0)
+
+
+def lookup(collection, dedup, limit=MAX_LOOKUP):
+    """Candidatures enregistrées partageant au moins une clé avec l'empreinte (index `dedup_keys`)."""
+    if not dedup["keys"]:
+        return []
+    projection = {
+        "dedup": 1, "identity_id": 1, "Job": 1, "Nom": 1, "llm_response": 1, **{field: 1 for field in EXTRACTION_FIELDS}
+    }
+    with metrics.span("mongo.identity_lookup", keys=len(dedup["keys"])):
+        return list(collection.find({"dedup.keys": {"$in": dedup["keys"]}}, projection).limit(limit))
+
+
+def extraction(document):
+    """
+    Réponse du LLM pour une candidature déjà analysée (None si elle ne l'a pas été) : la réponse brute
+    (`llm_response`), ou pour les candidatures plus anciennes, une réponse reconstituée à partir de
+    leurs champs (le champ Freelance peut alors venir du titre LinkedIn de cette candidature).
+    """
+    if document.get("llm_response"):
+        return dict(document["llm_response"])
+    if document.get("Diplôme", "N/A") == "N/A" and document.get("Compétences Tech", "N/A") == "N/A":
+        return None
+    return {key: str(document.get(field, "N/A")) for field, key in EXTRACTION_FIELDS.items()}
+
+
+class DuplicateIndex:
+    """Index LSH en mémoire, pour les candidatures d'un même import pas encore enregistrées."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, dedup, item):
+        for key in dedup["keys"]:
+            self.buckets.setdefault(key, []).append(item)
+
+    def query(self, dedup):
+        """Éléments partageant au moins une clé avec l'empreinte, sans doublon."""
+        items = {}
+        for key in dedup["keys"]:
+            for item in self.buckets.get(key, []):
+                items[id(item)] = item
+        return list(items.values())
+
+
+def link_all(collection, cv_text=None, batch_size=500):
+    """
+    Calcule l'empreinte des candidatures qui n'en ont pas et les rattache à une identité, dans l'ordre d'arrivée.
+
+    Args:
+        collection: Collection des candidatures.
+        cv_text (callable): Texte anonymisé du CV enregistré d'une candidature (voir pipeline.stored_cv_text),
+                            appelé avec le document (Nom, CV, CV_ref). Sans lui, l'empreinte ne repose que
+                            sur le nom, l'email et le téléphone.
+        batch_size (int): Nombre de mises à jour par requête.
+    """
+    linked = 0
+    index = DuplicateIndex()
+    operations = []
+    for document in collection.find({}, {"Nom": 1, "Mail": 1, "Téléphone": 1, "dedup": 1, "identity_id": 1}).sort("_id", 1):
+        if "dedup" not in document:
+            text = ""
+            if cv_text is not None:
+                text = cv_text(collection.find_one({"_id": document["_id"]}, {"Nom": 1, "CV": 1, "CV_ref": 1}))
+            document["dedup"] = fingerprint(document, text)
+            match, _ = best_match(document["dedup"], index.query(document["dedup"]))
+            document["identity_id"] = match["identity_id"] if match else ObjectId()
+            operations.append(UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {"dedup": document["dedup"], "identity_id": document["identity_id"]}},
+            ))
+        index.add(document["dedup"], document)
+        if len(operations) == batch_size:
+            linked += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        linked += collection.bulk_write(operations, ordered=False).modified_count
+    return linked
+
+
+if __name__ == "__main__":
+    from config import collection
+    from pipeline import stored_cv_text
+
+    print(f"{link_all(collection, stored_cv_text)} candidature(s) rattachée(s) à une identité.")
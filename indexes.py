@@ -0,0 +1,137 @@
+"""
+Gestion des index de la collection des candidatures.
+
+`ensure_indexes` est appelé une fois par processus par `config`. Le module peut aussi être lancé
+(`python -m indexes`) pour afficher les index manquants ou inutilisés, et les formes de requêtes
+de `gestion.get_applications` qui retombent sur un parcours complet de la collection (COLLSCAN).
+"""
+import datetime
+import itertools
+import logging
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Collation utilisée par toutes les requêtes de la page de gestion : un index n'est utilisable
+# pour une comparaison de chaînes que s'il a la même collation que la requête
+FR_COLLATION = {"locale": "fr", "strength": 1}
+
+INDEXES = [
+    # Un candidat n'est enregistré qu'une fois par job
+    IndexModel([("Job", ASCENDING), ("Nom", ASCENDING)], unique=True, name="job_nom_unique"),
+    # Filtres de gestion_page : égalités (Job, Statut, Freelance) puis intervalle (Expérience, Date)
+    IndexModel(
+        [("Job", ASCENDING), ("Statut", ASCENDING), ("Expérience", ASCENDING)],
+        collation=FR_COLLATION, name="job_statut_experience",
+    ),
+    IndexModel([("Statut", ASCENDING), ("Date", DESCENDING)], collation=FR_COLLATION, name="statut_date"),
+    IndexModel([("Freelance", ASCENDING), ("Expérience", ASCENDING)], collation=FR_COLLATION, name="freelance_experience"),
+    IndexModel([("Date", DESCENDING)], collation=FR_COLLATION, name="date"),
+    # Le filtre sur l'expérience est toujours présent : aucune requête ne parcourt toute la collection
+    IndexModel([("Expérience", ASCENDING)], collation=FR_COLLATION, name="experience"),
+    # Recherche plein texte (voir search.py)
+    IndexModel([("search_tokens", ASCENDING)], collation=FR_COLLATION, name="search_tokens"),
+    # Doublons approchants et candidatures d'une même personne (voir identities.py)
+    IndexModel([("dedup.keys", ASCENDING)], name="dedup_keys"),
+    IndexModel([("identity_id", ASCENDING)], name="identity_id"),
+]
+
+# File d'attente des imports (voir jobs.py)
+JOB_ITEM_INDEXES = [
+    IndexModel([("status", ASCENDING), ("job_id", ASCENDING), ("seq", ASCENDING)], name="status_job_seq"),
+    IndexModel([("job_id", ASCENDING), ("seq", ASCENDING)], name="job_seq"),
+]
+
+# Mesures de performance (voir metrics.py), conservées 30 jours
+METRIC_INDEXES = [
+    IndexModel([("at", ASCENDING)], expireAfterSeconds=30 * 24 * 3600, name="at_ttl"),
+    IndexModel([("stage", ASCENDING), ("at", ASCENDING)], name="stage_at"),
+]
+
+
+def ensure_indexes(collection, indexes=INDEXES):
+    """
+    Crée les index manquants. Chaque index est créé séparément pour qu'un échec
+    (doublons empêchant l'index unique par exemple) n'empêche pas la création des autres.
+    """
+    for index in indexes:
+        try:
+            collection.create_indexes([index])
+        except OperationFailure as e:
+            logging.error(f"Impossible de créer l'index {index.document['name']} : {e}")
+
+
+def missing_indexes(collection, indexes=INDEXES):
+    """Noms des index attendus absents de la collection."""
+    existing = collection.index_information()
+    return [index.document["name"] for index in indexes if index.document["name"] not in existing]
+
+
+def index_usage(collection):
+    """Nombre d'utilisations de chaque index depuis le dernier démarrage du serveur ($indexStats)."""
+    return {stat["name"]: stat["accesses"]["ops"] for stat in collection.aggregate([{"$indexStats": {}}])}
+
+
+def unused_indexes(collection):
+    """Index jamais utilisés depuis le dernier démarrage du serveur (hors _id)."""
+    return [name for name, ops in index_usage(collection).items() if ops == 0 and name != "_id_"]
+
+
+def plan_stages(plan):
+    """Liste (récursive) des étapes d'un plan d'exécution retourné par explain()."""
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+
+def query_shapes():
+    """
+    Formes de requêtes construites par gestion_page : toutes les combinaisons des filtres optionnels
+    (le filtre sur l'expérience est toujours présent), sans tri ou triées par date.
+    """
+    optional_filters = {
+        "Statut": 0,
+        "Date": {"$gte": datetime.datetime(2024, 1, 1), "$lte": datetime.datetime(2024, 2, 1)},
+        "Job": "Data Engineer",
+        "Freelance": "OUI",
+    }
+    shapes = []
+    for size in range(len(optional_filters) + 1):
+        for fields in itertools.combinations(optional_filters, size):
+            filters = {field: optional_filters[field] for field in fields}
+            filters["Expérience"] = {"$gte": -1, "$lte": 30}
+            shapes.append((filters, [], []))
+            shapes.append((filters, ["Date"], [False]))
+    return shapes
+
+
+def find_collscans(build_cursor, shapes=None):
+    """
+    Exécute explain() sur chaque forme de requête et retourne celles dont le plan gagnant
+    contient un COLLSCAN.
+
+    Args:
+        build_cursor (callable): Construit le curseur à partir de (filters, sort_columns, sort_orders).
+        shapes (list): Formes de requêtes à vérifier, par défaut `query_shapes()`.
+    """
+    collscans = []
+    for filters, sort_columns, sort_orders in shapes or query_shapes():
+        explain = build_cursor(filters, sort_columns, sort_orders).explain()
+        if "COLLSCAN" in plan_stages(explain["queryPlanner"]["winningPlan"]):
+            collscans.append((filters, sort_columns, sort_orders))
+    return collscans
+
+
+if __name__ == "__main__":
+    from config import collection
+    from gestion import applications_cursor
+
+    print("Index manquants :", missing_indexes(collection) or "aucun")
+    print("Index inutilisés :", unused_indexes(collection) or "aucun")
+    collscans = find_collscans(applications_cursor)
+    print(f"Requêtes en COLLSCAN : {len(collscans)}")
+    for filters, sort_columns, _ in collscans:
+        print(f"  - filtres {sorted(filters)}, tri {sort_columns}")
@@ -0,0 +1,97 @@
+"""
+Import en ligne de commande d'un dossier de mails de candidature (.msg), par exemple depuis un cron
+sur l'export de la boîte mail. Même pipeline que la page d'import (voir pipeline.py).
+
+Usage : python -m ingest DOSSIER [--workers 5] [--store-cv]
+
+Une ligne JSON est écrite sur la sortie standard pour chaque mail traité, puis une ligne
+de synthèse avec les statistiques de débit. Les mails déjà importés (journal des imports) sont
+ignorés : relancer la commande après une interruption reprend là où elle s'était arrêtée.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from llm_cache import ExtractionCache
+from pipeline import commit_result, process_mails
+from config import cache_collection, GEMINI_MAX_WORKERS, GEMINI_PACK_SIZE, LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_ENTRIES
+
+
+def read_mails(paths):
+    """Lit les fichiers .msg un par un, au rythme du pipeline."""
+    for path in paths:
+        with open(path, "rb") as f:
+            yield os.path.basename(path), f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="Dossier contenant les fichiers .msg")
+    parser.add_argument("--workers", type=int, default=GEMINI_MAX_WORKERS, help="Nombre d'appels simultanés au LLM")
+    parser.add_argument("--pack", type=int, default=GEMINI_PACK_SIZE, help="Nombre maximum de CV par requête au LLM")
+    parser.add_argument("--store-cv", action="store_true", help="Stocker les CV dans la base de données")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    out = sys.stdout
+
+    def emit(event):
+        out.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+
+    paths = sorted(
+        os.path.join(args.folder, name) for name in os.listdir(args.folder) if name.lower().endswith(".msg")
+    )
+    cache = ExtractionCache(cache_collection, LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_ENTRIES)
+    counts = {"inserted": 0, "already_present": 0, "skipped": 0, "duplicates": 0, "errors": 0}
+    llm_calls = 0
+    tokens = {"before": 0, "after": 0}
+    start = time.perf_counter()
+
+    # Les traces des bibliothèques sont renvoyées sur la sortie d'erreur : stdout ne contient que du JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        for processed, result in enumerate(process_mails(read_mails(paths), cache, max_workers=args.workers, pack_size=args.pack), start=1):
+            # Chaque candidat est enregistré dès que son mail est traité : une interruption ne perd rien
+            llm_calls += result["llm_calls"]
+            if result["error"]:
+                counts["errors"] += 1
+            elif result["source"] == "journal":
+                counts["skipped"] += 1
+            else:
+                counts["duplicates"] += result["source"] == "duplicate"
+                for key, value in commit_result(result, args.store_cv).items():
+                    counts[key] += value
+            if result["tokens"]:
+                tokens["before"] += result["tokens"]["before"]
+                tokens["after"] += result["tokens"]["after"]
+            emit({
+                "event": "mail",
+                "file": result["filename"],
+                "status": "error" if result["error"] else "skipped" if result["source"] == "journal" else "ok",
+                "source": result["source"],
+                "error": result["error"],
+                "tokens": result["tokens"],
+                "processed": processed,
+                "total": len(paths),
+                "elapsed": round(time.perf_counter() - start, 2),
+            })
+
+    elapsed = time.perf_counter() - start
+    emit({
+        "event": "summary",
+        "mails": len(paths),
+        "llm_calls": llm_calls,
+        "cache_hits": cache.hits,
+        **counts,
+        "tokens_before": tokens["before"],
+        "tokens_after": tokens["after"],
+        "elapsed": round(elapsed, 2),
+        "mails_per_minute": round(60 * len(paths) / elapsed, 1) if elapsed else None,
+    })
+
+
+if __name__ == "__main__":
+    main()
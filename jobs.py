@@ -0,0 +1,177 @@
+"""
+File d'attente persistante des imports (collections MongoDB `jobs` et `job_items`).
+
+La page d'import se contente d'enregistrer les mails (`enqueue`) et d'afficher la progression ;
+un ou plusieurs workers (`python -m worker`) traitent les mails en arrière-plan. Un import survit
+donc à la fermeture de l'onglet ou à un rerun Streamlit, et plusieurs recruteurs peuvent lancer
+des imports en même temps.
+"""
+import datetime
+from bson import Binary, ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from codec import decode, encode
+from journal import mail_hash, processed_hashes
+from config import jobs_collection, job_items_collection
+
+# Durée au-delà de laquelle un mail en cours de traitement est considéré comme abandonné
+# (worker arrêté) et peut être repris par un autre worker. Un worker actif renouvelle ses
+# réservations toutes les LEASE_RENEW_SECONDS secondes (voir `renew_leases`).
+LEASE_SECONDS = 600
+LEASE_RENEW_SECONDS = 60
+
+# Champs du candidat absents du résumé affiché sur la page d'import
+SUMMARY_EXCLUDED = ("CV", "dedup", "identity_id", "llm_response")
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def enqueue(mails, store_cv):
+    """
+    Enregistre un import dans la file d'attente. Les mails déjà importés (présents dans le journal
+    des imports) ne sont pas remis en file.
+
+    Args:
+        mails (list): Couples (nom du fichier .msg, contenu).
+        store_cv (bool): Stocker les CV dans la base de données.
+
+    Returns:
+        tuple: Identifiant de l'import (None si tous les mails ont déjà été importés)
+               et nombre de mails ignorés.
+    """
+    hashes = [mail_hash(msg_bytes) for _, msg_bytes in mails]
+    already_processed = processed_hashes(hashes)
+    mails = [mail for mail, digest in zip(mails, hashes) if digest not in already_processed]
+    skipped = len(hashes) - len(mails)
+    if not mails:
+        return None, skipped
+
+    job_id = jobs_collection.insert_one({
+        "status": "pending",
+        "store_cv": store_cv,
+        "total": len(mails),
+        "processed": 0,
+        "errors": 0,
+        "skipped": skipped,
+        "llm_calls": 0,
+        "cache_hits": 0,
+        "duplicates": 0,
+        "inserted": 0,
+        "already_present": 0,
+        "created_at": _now(),
+    }).inserted_id
+    job_items_collection.insert_many([
+        {"job_id": job_id, "seq": seq, "filename": filename, "data": Binary(encode(msg_bytes)), "status": "pending"}
+        for seq, (filename, msg_bytes) in enumerate(mails)
+    ])
+    return job_id, skipped
+
+
+def claim_items(worker_id, limit):
+    """
+    Réserve jusqu'à `limit` mails à traiter : en attente, ou abandonnés par un worker arrêté.
+    La réservation est atomique : deux workers ne traitent jamais le même mail.
+    """
+    items = []
+    for _ in range(limit):
+        now = _now()
+        item = job_items_collection.find_one_and_update(
+            {"$or": [{"status": "pending"}, {"status": "running", "lease_until": {"$lt": now}}]},
+            {"$set": {
+                "status": "running",
+                "worker": worker_id,
+                "lease_until": now + datetime.timedelta(seconds=LEASE_SECONDS),
+            }},
+            sort=[("job_id", ASCENDING), ("seq", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if item is None:
+            break
+        jobs_collection.update_one({"_id": item["job_id"], "status": "pending"}, {"$set": {"status": "running"}})
+        items.append(item)
+    return items
+
+
+def renew_leases(worker_id):
+    """Prolonge la réservation des mails en cours de traitement par ce worker."""
+    return job_items_collection.update_many(
+        {"status": "running", "worker": worker_id},
+        {"$set": {"lease_until": _now() + datetime.timedelta(seconds=LEASE_SECONDS)}},
+    ).modified_count
+
+
+def item_mail(item):
+    """Nom du fichier et contenu du mail d'un élément de la file."""
+    return item["filename"], decode(item["data"])
+
+
+def job_settings(job_ids):
+    """Paramètres (store_cv) des imports donnés."""
+    return {job["_id"]: job for job in jobs_collection.find({"_id": {"$in": list(job_ids)}}, {"store_cv": 1})}
+
+
+def complete_item(item, result, counts=None):
+    """
+    Enregistre le résultat d'un mail et met à jour la progression de son import.
+
+    La progression n'est comptée qu'une fois : si la réservation a expiré et que le mail a été repris
+    (ou terminé) par un autre worker, le résultat est ignoré.
+
+    Args:
+        item (dict): Élément de la file, tel que réservé par `claim_items`.
+        result (dict): Résultat du pipeline (voir pipeline.process_mails).
+        counts (dict): Candidats ajoutés ("inserted") et déjà présents ("already_present"), voir pipeline.commit_result.
+
+    Returns:
+        bool: Vrai si le résultat a été enregistré.
+    """
+    counts = counts or {}
+    candidate = result["candidate"]
+    updated = job_items_collection.update_one(
+        {"_id": item["_id"], "status": "running", "worker": item["worker"]},
+        {
+            "$set": {
+                "status": "failed" if result["error"] else "done",
+                "error": result["error"],
+                "tokens": result["tokens"],
+                # Résumé affiché sur la page d'import
+                "result": {key: value for key, value in candidate.items() if key not in SUMMARY_EXCLUDED} if candidate else None,
+                "finished_at": _now(),
+            },
+            "$unset": {"data": "", "lease_until": ""},
+        },
+    )
+    if not updated.modified_count:
+        return False
+    job = jobs_collection.find_one_and_update(
+        {"_id": item["job_id"]},
+        {"$inc": {
+            "processed": 1,
+            "errors": 1 if result["error"] else 0,
+            "llm_calls": result["llm_calls"],  # Requêtes envoyées au LLM (voir pipeline.process_mails)
+            "cache_hits": 1 if result["source"] == "cache" else 0,
+            "duplicates": 1 if result["source"] == "duplicate" else 0,  # Extraction d'un CV presque identique
+            "skipped": 1 if result["source"] == "journal" else 0,  # Importé entre-temps
+            "inserted": counts.get("inserted", 0),
+            "already_present": counts.get("already_present", 0),
+        }},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job["processed"] >= job["total"]:
+        jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"status": "done", "finished_at": _now()}})
+    return True
+
+
+def get_jobs(job_ids):
+    """Progression des imports donnés, du plus récent au plus ancien."""
+    return list(jobs_collection.find({"_id": {"$in": [ObjectId(job_id) for job_id in job_ids]}}).sort("created_at", -1))
+
+
+def job_results(job_id):
+    """Candidats extraits par un import terminé."""
+    return [
+        item["result"]
+        for item in job_items_collection.find({"job_id": ObjectId(job_id), "status": "done"}, {"result": 1}).sort("seq", 1)
+        if item["result"]
+    ]
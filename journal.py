@@ -0,0 +1,37 @@
+"""
+Journal des mails déjà importés (collection `ingest_journal`), indexé par l'empreinte SHA-256 du .msg.
+
+Chaque mail est enregistré dans le journal dès que son candidat est écrit dans la base : un import
+interrompu reprend là où il s'était arrêté, et un mail importé une seconde fois est ignoré sans
+nouvel appel au LLM.
+"""
+import datetime
+import hashlib
+from config import journal_collection
+
+
+def mail_hash(msg_bytes):
+    return hashlib.sha256(msg_bytes).hexdigest()
+
+
+def is_processed(digest):
+    return journal_collection.find_one({"_id": digest}, {"_id": 1}) is not None
+
+
+def processed_hashes(digests):
+    """Empreintes déjà présentes dans le journal parmi `digests`."""
+    return {entry["_id"] for entry in journal_collection.find({"_id": {"$in": list(digests)}}, {"_id": 1})}
+
+
+def record(digest, filename, candidate, tokens=None):
+    journal_collection.update_one(
+        {"_id": digest},
+        {"$setOnInsert": {
+            "filename": filename,
+            "Job": candidate.get("Job"),
+            "Nom": candidate.get("Nom"),
+            "tokens": tokens,  # Tokens du CV avant et après compaction
+            "processed_at": datetime.datetime.now(datetime.timezone.utc),
+        }},
+        upsert=True,
+    )
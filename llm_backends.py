@@ -0,0 +1,219 @@
+"""
+Backends d'appel au LLM.
+
+- `GeminiBackend` : l'API Gemini (par défaut).
+- `FakeBackend` : LLM factice local, pour tester la charge de l'import sans consommer de quota.
+  Il renvoie des réponses conformes au schéma attendu, avec une latence configurable, un quota de
+  requêtes par minute (au-delà : `ResourceExhausted`, comme l'API) et des réponses JSON invalides
+  injectées à la demande.
+- `HttpBackend` : client d'un `FakeBackend` servi en HTTP sur localhost (`python -m llm_backends serve`),
+  pour partager un même quota factice entre plusieurs workers.
+
+Le backend est choisi par la variable d'environnement LLM_BACKEND : "gemini", "fake" (avec ses
+options, ex. "fake?latency=lognormal:2:0.5&rpm=15&malformed=0.05") ou l'URL du serveur factice.
+Chaque backend a un nom (`name`) qui entre dans la clé du cache des extractions : les réponses
+d'un LLM factice ne sont jamais servies à un import réel.
+
+Usage:
+    python -m llm_backends serve --port 8765 --latency uniform:0.5:3 --rpm 15 --malformed 0.05
+"""
+import argparse
+import collections
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import google.api_core.exceptions
+
+# Identifiants des CV d'un prompt groupé (voir packing.build_packed_prompt)
+PACKED_ID_PATTERN = re.compile(r"=== CV id=(\S+) ===")
+
+
+class GeminiBackend:
+    """Appel à l'API Gemini, avec une réponse au format JSON."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.name = model_name
+        self.model = None
+
+    def generate(self, prompt):
+        if self.model is None:  # Client créé au premier appel
+            from config import get_genai
+            self.model = get_genai().GenerativeModel(self.model_name)
+        response = self.model.generate_content(
+            prompt,
+            generation_config={"response_mime_type": "application/json"},
+        )
+        return response.text
+
+
+def parse_latency(spec):
+    """
+    Distribution de latence (en secondes) d'après sa description : "0.5" ou "constant:0.5",
+    "uniform:min:max", "lognormal:médiane:sigma". Retourne une fonction `rng -> latence`.
+    """
+    kind, *params = spec.split(":") if ":" in spec else ("constant", spec)
+    params = [float(param) for param in params]
+    if kind == "constant":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(*params)
+    if kind == "lognormal":
+        median, sigma = params
+        return lambda rng: rng.lognormvariate(0, sigma) * median
+    raise ValueError(f"Distribution de latence inconnue : {spec}")
+
+
+class FakeBackend:
+    """
+    LLM factice, déterministe à graine fixée.
+
+    Args:
+        latency (str): Distribution de la latence de chaque réponse (voir `parse_latency`).
+        rpm (int): Requêtes acceptées par minute glissante, au-delà `ResourceExhausted` (None : illimité).
+        malformed (float): Proportion de réponses au JSON invalide.
+        script (iterable): Issues imposées aux premiers appels, avant le tirage aléatoire :
+                           "ok", "429" (quota dépassé) ou "malformed".
+        seed (int): Graine du générateur aléatoire.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency="0", rpm=None, malformed=0.0, script=(), seed=0):
+        self.latency = parse_latency(latency)
+        self.rpm = rpm
+        self.malformed = malformed
+        self.script = collections.deque(script)
+        self.rng = random.Random(seed)
+        self.requests = collections.deque()  # Horodatage des requêtes acceptées sur la dernière minute
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _outcome(self):
+        """Issue de l'appel (et latence à simuler), tirée sous verrou pour rester déterministe."""
+        with self.lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self.requests and now - self.requests[0] >= 60:
+                self.requests.popleft()
+
+            outcome = self.script.popleft() if self.script else None
+            if outcome is None and self.rpm is not None and len(self.requests) >= self.rpm:
+                outcome = "429"
+            if outcome is None:
+                outcome = "malformed" if self.rng.random() < self.malformed else "ok"
+            if outcome != "429":
+                self.requests.append(now)
+            return outcome, self.latency(self.rng)
+
+    def generate(self, prompt):
+        outcome, latency = self._outcome()
+        if outcome == "429":
+            raise google.api_core.exceptions.ResourceExhausted("Quota du LLM factice dépassé.")
+        time.sleep(latency)
+
+        ids = PACKED_ID_PATTERN.findall(prompt)
+        if ids:
+            text = json.dumps([{"id": cv_id, **fake_extraction(prompt + cv_id)} for cv_id in ids], ensure_ascii=False)
+        else:
+            text = json.dumps(fake_extraction(prompt), ensure_ascii=False)
+        # JSON tronqué, comme une réponse coupée par le modèle
+        return text[:len(text) // 2] if outcome == "malformed" else text
+
+
+def fake_extraction(seed_text):
+    """Réponse conforme au schéma du prompt, dérivée du texte pour être stable d'un appel à l'autre."""
+    digest = int(hashlib.sha256(seed_text.encode("utf-8")).hexdigest(), 16)
+    return {
+        "Freelance": "OUI" if digest % 5 == 0 else "NON",
+        "Année de diplomation": str(2005 + digest % 20),
+        "Expérience": str(digest % 15),
+        "Entreprises": "Entreprise A, Entreprise B",
+        "Compétences": "Python, SQL, Spark, Airflow, dbt",
+    }
+
+
+class HttpBackend:
+    """Client d'un LLM factice servi en HTTP (voir `serve`)."""
+
+    def __init__(self, url, timeout=120):
+        self.url = url
+        self.name = f"fake@{url}"
+        self.timeout = timeout
+
+    def generate(self, prompt):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"prompt": prompt}).encode("utf-8"), headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())["text"]
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise google.api_core.exceptions.ResourceExhausted(e.read().decode("utf-8", "replace"))
+            raise
+
+
+def get_backend(spec, model_name):
+    """Backend décrit par `spec` : "gemini", "fake[?options]" ou URL d'un serveur factice."""
+    if spec == "gemini":
+        return GeminiBackend(model_name)
+    if spec.startswith(("http://", "https://")):
+        return HttpBackend(spec)
+    if spec.split("?")[0] == "fake":
+        options = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(spec).query))
+        return FakeBackend(
+            latency=options.get("latency", "0"),
+            rpm=int(options["rpm"]) if "rpm" in options else None,
+            malformed=float(options.get("malformed", 0)),
+            seed=int(options.get("seed", 0)),
+        )
+    raise ValueError(f"Backend LLM inconnu : {spec}")
+
+
+def serve(backend, host="127.0.0.1", port=8765):
+    """Sert `backend` en HTTP : POST {"prompt": ...} -> 200 {"text": ...}, ou 429 si le quota est dépassé."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            prompt = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["prompt"]
+            try:
+                status, body = 200, json.dumps({"text": backend.generate(prompt)})
+            except google.api_core.exceptions.ResourceExhausted as e:
+                status, body = 429, str(e)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"LLM factice sur http://{host}:{server.server_port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Servir un LLM factice sur localhost")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--latency", default="0", help="Ex : 0.5, uniform:0.5:3, lognormal:2:0.5")
+    serve_parser.add_argument("--rpm", type=int, default=None, help="Requêtes acceptées par minute")
+    serve_parser.add_argument("--malformed", type=float, default=0.0, help="Proportion de réponses au JSON invalide")
+    serve_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    serve(FakeBackend(args.latency, args.rpm, args.malformed, seed=args.seed), port=args.port)
+
+
+if __name__ == "__main__":
+    main()
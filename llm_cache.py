@@ -0,0 +1,96 @@
+import datetime
+import hashlib
+import logging
+import pymongo
+from pymongo.errors import OperationFailure
+
+# Code d'erreur MongoDB d'un index existant avec d'autres options (IndexOptionsConflict)
+INDEX_OPTIONS_CONFLICT = 85
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(text, prompt_template, model):
+    """
+    Clé de cache d'une extraction : modèle + empreinte du prompt + empreinte du CV anonymisé.
+    Toute modification du prompt ou du modèle invalide donc les entrées existantes.
+    """
+    return f"{model}:{_sha256(prompt_template)[:16]}:{_sha256(text)}"
+
+
+class ExtractionCache:
+    """
+    Cache persistant (collection MongoDB) des réponses du LLM.
+
+    Les entrées expirent au bout de `ttl_days` jours (index TTL) et les plus anciennes
+    sont supprimées au-delà de `max_entries` entrées.
+    Les compteurs `hits` et `misses` sont propres à l'instance.
+    """
+
+    _indexed = False
+
+    def __init__(self, collection, ttl_days, max_entries):
+        self.collection = collection
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        if ExtractionCache._indexed:
+            return
+        ttl = self.ttl_days * 24 * 3600
+        try:
+            self.collection.create_index([("created_at", pymongo.ASCENDING)], expireAfterSeconds=ttl)
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            # LLM_CACHE_TTL_DAYS a changé : mise à jour de la durée de l'index existant
+            self.collection.database.command(
+                "collMod", self.collection.name,
+                index={"keyPattern": {"created_at": pymongo.ASCENDING}, "expireAfterSeconds": ttl},
+            )
+            logging.info(f"Durée de conservation du cache LLM mise à jour : {self.ttl_days} jours.")
+        ExtractionCache._indexed = True
+
+    def get(self, key):
+        """Retourne la réponse en cache pour `key`, ou None."""
+        entry = self.collection.find_one({"_id": key}, {"response": 1})
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["response"]
+
+    def get_any(self, keys):
+        """Retourne la réponse en cache pour la première clé de `keys` présente, ou None (un seul accès compté)."""
+        entries = {entry["_id"]: entry["response"] for entry in self.collection.find({"_id": {"$in": list(keys)}}, {"response": 1})}
+        for key in keys:
+            if key in entries:
+                self.hits += 1
+                return entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, response):
+        self.collection.replace_one(
+            {"_id": key},
+            {"response": response, "created_at": datetime.datetime.now(datetime.timezone.utc)},
+            upsert=True,
+        )
+
+    def evict(self):
+        """Supprime les entrées les plus anciennes si le cache dépasse sa taille maximale."""
+        excess = self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return 0
+        oldest = [
+            entry["_id"]
+            for entry in self.collection.find({}, {"_id": 1}).sort("created_at", pymongo.ASCENDING).limit(excess)
+        ]
+        self.collection.delete_many({"_id": {"$in": oldest}})
+        logging.info(f"{len(oldest)} entrée(s) supprimée(s) du cache LLM.")
+        return len(oldest)
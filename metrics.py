@@ -0,0 +1,157 @@
+"""
+Instrumentation légère des étapes de l'import et des requêtes MongoDB.
+
+Chaque étape mesurée produit un span : nom de l'étape, durée, document en cours de traitement
+(voir `document`), erreur éventuelle et attributs. Les spans sont mis en tampon puis écrits par lots
+dans la collection `metrics` (conservés 30 jours), ou dans un fichier JSON lines si la variable
+d'environnement METRICS_FILE est définie. Une erreur d'écriture des mesures n'interrompt jamais
+le traitement.
+
+Les mesures peuvent être désactivées (METRICS_ENABLED=0, ou `disable()` pour les tests et les benchmarks) :
+aucun span n'est alors conservé ni écrit.
+"""
+import atexit
+import contextlib
+import contextvars
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+METRICS_FILE = os.environ.get("METRICS_FILE")
+ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+# Écriture du tampon au-delà de FLUSH_SIZE spans ou FLUSH_INTERVAL secondes
+FLUSH_SIZE = 200
+FLUSH_INTERVAL = 5
+
+_document = contextvars.ContextVar("document", default=None)
+_buffer = []
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def disable():
+    """Désactive les mesures (les spans en tampon sont abandonnés)."""
+    global ENABLED
+    ENABLED = False
+    with _lock:
+        _buffer.clear()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+@contextlib.contextmanager
+def document(name):
+    """Rattache les spans émis dans le bloc (par le même thread) au document `name`."""
+    token = _document.set(name)
+    try:
+        yield
+    finally:
+        _document.reset(token)
+
+
+class Span:
+    def __init__(self, attrs):
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Ajoute des attributs au span (moteur utilisé, nombre de tentatives...)."""
+        self.attrs.update(attrs)
+
+
+@contextlib.contextmanager
+def span(stage, **attrs):
+    """Mesure la durée du bloc."""
+    current = Span(attrs)
+    error = None
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        emit(stage, time.perf_counter() - start, error, **current.attrs)
+
+
+def timed(stage):
+    """Décorateur : mesure chaque appel de la fonction."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def event(stage, error=None, **attrs):
+    """Événement sans durée (nouvel essai, bascule vers un autre moteur...), avec l'erreur éventuelle."""
+    emit(stage, None, error, **attrs)
+
+
+def emit(stage, duration, error=None, defer=False, **attrs):
+    """
+    Met un span en tampon. Avec `defer`, le span n'entraîne jamais l'écriture du tampon (qui ouvrirait
+    la connexion à MongoDB) : il est écrit avec les suivants, par exemple depuis l'écran de connexion.
+    """
+    if not ENABLED:
+        return
+    record = {
+        "stage": stage,
+        "ms": round(duration * 1000, 3) if duration is not None else None,
+        "doc": _document.get(),
+        "error": error,
+        "attrs": attrs,
+        "at": datetime.datetime.now(datetime.timezone.utc),
+    }
+    with _lock:
+        _buffer.append(record)
+        due = len(_buffer) >= FLUSH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due and not defer:
+        flush()
+
+
+def flush():
+    """Écrit les spans en tampon."""
+    global _last_flush
+    with _lock:
+        records = list(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not records:
+        return
+    try:
+        if METRICS_FILE:
+            with open(METRICS_FILE, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        else:
+            from config import metrics_collection
+            metrics_collection.insert_many(records, ordered=False)
+    except Exception as e:
+        logging.warning(f"{len(records)} mesure(s) de performance perdue(s) : {e}")
+
+
+def load(since):
+    """Spans enregistrés depuis `since` (datetime UTC)."""
+    flush()
+    if METRICS_FILE:
+        if not os.path.exists(METRICS_FILE):
+            return []
+        with open(METRICS_FILE, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        for record in records:
+            record["at"] = datetime.datetime.fromisoformat(record["at"])
+        return [record for record in records if record["at"] >= since]
+
+    from config import metrics_collection
+    return list(metrics_collection.find({"at": {"$gte": since}}, {"_id": 0}))
+
+
+atexit.register(flush)
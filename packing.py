@@ -0,0 +1,105 @@
+"""
+Regroupement de plusieurs CV anonymisés dans une seule requête au LLM.
+
+Le facteur limitant de l'import est le nombre de requêtes par minute, pas le nombre de tokens :
+envoyer N CV par requête divise d'autant le nombre d'appels. La réponse attendue est un tableau
+JSON dont chaque élément est identifié par l'"id" du CV correspondant.
+"""
+from rate_limit import estimate_tokens
+from utils import LLM_REQUIRED_FIELDS
+
+# Tokens de réponse estimés par CV
+OUTPUT_TOKENS_PER_CV = 300
+
+packed_prompt = """
+Tu joues le rôle d'un recruteur data qui doit extraire des informations clés de plusieurs CV.
+Des candidat(e)s ont envoyé leur CV par mail. Chaque CV est précédé de son identifiant.
+
+Pour chaque CV, retrouve les éléments suivants :
+- L'année de diplomation
+- La durée totale d'expérience professionnelle cumulée en années
+- Les entreprises associées aux expériences professionnelles (pas celles liées aux stages)
+- Les 5 compétences techniques data clés
+- Si le candidat est freelance ou non.
+
+Je veux une réponse sous forme d'un tableau JSON, avec un élément par CV ayant la structure suivante :
+[{{"id": "identifiant du CV",
+"Freelance" : "OUI/NON",
+"Année de diplomation": "YYYY",
+"Expérience": "X",
+"Entreprises":"entreprise1, entreprise2, entreprise3",
+"Compétences": "compétence1, compétence2, compétence3, compétence4, compétence5"}}]
+
+Pour l'année de diplomation, fais attention car parfois une formation est spécifiée avec les dates de début et de fin.
+Par exemple : 09/2022 - 06/2024 ou bien 2021 à 2022. Dans ces cas-là, il faut aller chercher l'année de fin, c'est-à-dire
+respectivement 2024 et 2022. De plus il peut y avoir plusieurs diplômes, dans ce cas, il faut prendre le plus récent.
+
+Pour la durée d'expérience, merci de ne pas compter les stages ou alternances, seulement les expériences professionnelles.
+Par exemple, si le candidat a travaillé 6 mois en stage et 2 ans et demi en CDI, merci de renvoyer 2,5.
+
+Les informations d'un CV ne doivent jamais être attribuées à un autre CV.
+
+{cvs}
+"""
+
+
+def cv_cost(text):
+    """Tokens consommés par un CV dans une requête groupée (texte + réponse)."""
+    return estimate_tokens(text, output_tokens=OUTPUT_TOKENS_PER_CV)
+
+
+class Packer:
+    """
+    Accumule les CV à envoyer au LLM et indique quand le paquet est plein : au plus `max_cvs` CV,
+    et au plus `max_tokens` tokens estimés (texte des CV et réponses), prompt compris.
+    """
+
+    def __init__(self, max_cvs, max_tokens):
+        self.max_cvs = max_cvs
+        self.max_tokens = max_tokens
+        self.items = {}
+        self.tokens = estimate_tokens(packed_prompt, output_tokens=0)
+
+    def fits(self, text):
+        """Un CV de plus tient-il dans le paquet ? Un paquet vide accepte toujours un CV."""
+        if not self.items:
+            return True
+        return len(self.items) < self.max_cvs and self.tokens + cv_cost(text) <= self.max_tokens
+
+    def add(self, cv_id, text, entry):
+        self.items[cv_id] = (text, entry)
+        self.tokens += cv_cost(text)
+
+    def full(self):
+        return len(self.items) >= self.max_cvs
+
+    def take(self):
+        """Vide le paquet et retourne son contenu : {id: (texte, entrée)}."""
+        items, self.items = self.items, {}
+        self.tokens = estimate_tokens(packed_prompt, output_tokens=0)
+        return items
+
+
+def build_packed_prompt(texts):
+    """Prompt groupé pour `texts` ({id: texte anonymisé})."""
+    cvs = "\n\n".join(f"=== CV id={cv_id} ===\n{text}" for cv_id, text in texts.items())
+    return packed_prompt.format(cvs=cvs)
+
+
+def parse_packed_response(response):
+    """
+    Réponses du LLM par identifiant de CV ({id: réponse}). Les éléments incomplets sont ignorés :
+    les CV correspondants sont considérés comme en échec.
+    """
+    if isinstance(response, dict):
+        # Tableau parfois encapsulé dans un objet ({"cvs": [...]})
+        response = next((value for value in response.values() if isinstance(value, list)), [])
+    if not isinstance(response, list):
+        return {}
+
+    responses = {}
+    for item in response:
+        if isinstance(item, dict) and "id" in item and LLM_REQUIRED_FIELDS.keys() <= item.keys():
+            item = dict(item)
+            responses[str(item.pop("id"))] = item
+    return responses
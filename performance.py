@@ -0,0 +1,92 @@
+import datetime
+import streamlit as st
+import pandas as pd
+import metrics
+
+PERIODS = {
+    "Dernière heure": datetime.timedelta(hours=1),
+    "24 dernières heures": datetime.timedelta(days=1),
+    "7 derniers jours": datetime.timedelta(days=7),
+    "30 derniers jours": datetime.timedelta(days=30),
+}
+
+# Événements comptés (sans durée)
+EVENTS = {
+    "import.llm_retry": "Nouveaux essais (quota LLM dépassé)",
+    "import.llm_error": "Erreurs du LLM",
+    "import.llm_split": "Paquets de CV redécoupés",
+    "import.pdf_fallback": "Bascules PyPDF2 → pdfplumber",
+}
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_spans(period):
+    """Spans de la période, en DataFrame (une ligne par span)."""
+    since = datetime.datetime.now(datetime.timezone.utc) - PERIODS[period]
+    df = pd.DataFrame(metrics.load(since))
+    if not df.empty:
+        df["at"] = pd.to_datetime(df["at"], utc=True)
+    return df
+
+def latency_table(df):
+    """p50 / p95 / max et nombre d'erreurs par étape."""
+    timed = df[df["ms"].notna()]
+    table = timed.groupby("stage")["ms"].agg(
+        Appels="count",
+        p50=lambda ms: ms.quantile(0.5),
+        p95=lambda ms: ms.quantile(0.95),
+        Max="max",
+        Total="sum",
+    )
+    table["Erreurs"] = timed[timed["error"].notna()].groupby("stage").size()
+    table = table.fillna({"Erreurs": 0}).astype({"Erreurs": int})
+    return table.sort_values("Total", ascending=False).rename_axis("Étape")
+
+def slowest_documents(df, limit=10):
+    """Documents dont la préparation a été la plus longue, avec l'étape la plus coûteuse."""
+    by_document = df[df["doc"].notna() & df["ms"].notna()]
+    prepare = by_document[by_document["stage"] == "import.prepare"].nlargest(limit, "ms")
+    if prepare.empty:
+        return prepare
+    stages = by_document[by_document["doc"].isin(prepare["doc"]) & (by_document["stage"] != "import.prepare")]
+    slowest_stage = stages.loc[stages.groupby("doc")["ms"].idxmax(), ["doc", "stage", "ms"]]
+    return prepare[["doc", "ms", "at"]].merge(slowest_stage, on="doc", how="left", suffixes=("", "_étape")).rename(
+        columns={"doc": "Document", "ms": "Durée (ms)", "at": "Date", "stage": "Étape la plus longue",
+                 "ms_étape": "Durée de l'étape (ms)"}
+    )
+
+def performance_page():
+    st.title("⚡ Performance")
+
+    period = st.selectbox("Période :", list(PERIODS), index=1)
+    df = load_spans(period)
+    if df.empty:
+        st.warning("Aucune mesure sur la période.")
+        return
+
+    # Débit : mails enregistrés par minute d'activité
+    commits = df[df["stage"] == "import.commit"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Mails importés", len(commits))
+    if len(commits) > 1:
+        minutes = (commits["at"].max() - commits["at"].min()).total_seconds() / 60
+        col2.metric("Débit (mails/min)", f"{len(commits) / minutes:.1f}" if minutes else "—")
+    llm = df[df["stage"] == "import.llm"]
+    col3.metric("Requêtes au LLM", len(llm))
+    col4.metric("Attente de quota (s)", f"{df.loc[df['stage'] == 'import.quota_wait', 'ms'].sum() / 1000:.0f}")
+
+    st.subheader("Nouveaux essais et erreurs")
+    counts = df[df["stage"].isin(EVENTS)].groupby("stage").size()
+    st.dataframe(
+        pd.DataFrame({"Événement": list(EVENTS.values()), "Nombre": [int(counts.get(stage, 0)) for stage in EVENTS]}),
+        hide_index=True,
+    )
+
+    st.subheader("Latence par étape (ms)")
+    st.dataframe(latency_table(df).style.format("{:.1f}", subset=["p50", "p95", "Max", "Total"]))
+
+    st.subheader("Mails importés par heure")
+    if not commits.empty:
+        st.bar_chart(commits.set_index("at").resample("h").size().rename("Mails"))
+
+    st.subheader("Documents les plus lents")
+    st.dataframe(slowest_documents(df), hide_index=True)
@@ -0,0 +1,532 @@
+"""
+Pipeline d'import des candidatures, indépendant de l'interface : lecture du .msg, extraction du CV
+et de son texte, anonymisation, appel au LLM, validation de la réponse et enregistrement dans MongoDB.
+
+Utilisé par la page d'import (upload.py) et par l'import en ligne de commande (ingest.py).
+"""
+import logging
+import os
+import re
+import io
+import json
+import time
+import google.api_core.exceptions
+import extract_msg
+from concurrent.futures import as_completed
+from bson import Binary, ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from utils import *
+from search import build_search_tokens
+from cache import invalidate
+from blobs import load_cv, store_blobs
+from rate_limit import LLMScheduler, SharedRateLimiter, estimate_tokens
+from llm_cache import cache_key
+from compaction import compact_cv
+from llm_backends import get_backend
+from packing import Packer, build_packed_prompt, packed_prompt, parse_packed_response
+import identities
+import journal
+import metrics
+from config import (
+    collection, quota_collection, GEMINI_MODEL, GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_WORKERS, GEMINI_PACK_SIZE,
+    GEMINI_PACK_MAX_TOKENS, CV_TOKEN_BUDGET, LLM_BACKEND,
+)
+
+# Backend d'appel au LLM (l'API Gemini, ou un LLM factice pour les tests de charge)
+llm_backend = get_backend(LLM_BACKEND, GEMINI_MODEL)
+
+# Limiteur partagé par tous les processus (application, workers, ingest) : le quota est lié à la clé d'API
+gemini_limiter = SharedRateLimiter(quota_collection, llm_backend.name, GEMINI_RPM, GEMINI_TPM)
+
+# Réponse retournée quand le LLM n'a pas pu répondre (quota épuisé, erreur réseau, JSON invalide...)
+FALLBACK_RESPONSE = {"Année de diplomation": "N/A", "Compétences": "N/A"}
+
+
+def insert_into_mongo(candidates):
+    """
+    Insère les candidats dans MongoDB en une seule requête `bulk_write`, uniquement si la combinaison
+    de "Job" et "Nom" n'existe pas déjà (upsert + $setOnInsert, garanti par l'index unique sur (Job, Nom)).
+    Les doublons approchants (même personne sur un autre job, nom écrit autrement) sont rattachés à la
+    même identité en amont, par `process_mails` (voir identities.py).
+
+    Returns:
+        dict: Nombre de candidats ajoutés ("inserted") et déjà présents dans la base ("already_present").
+    """
+    for data in candidates:
+        data["search_tokens"] = build_search_tokens(data)
+
+    operations = [
+        UpdateOne({"Job": data["Job"], "Nom": data["Nom"]}, {"$setOnInsert": data}, upsert=True)
+        if data["Job"] and data["Nom"]
+        else InsertOne(data)
+        for data in candidates
+    ]
+    if not operations:
+        return {"inserted": 0, "already_present": 0}
+
+    with metrics.span("mongo.insert_candidates", rows=len(operations)):
+        try:
+            result = collection.bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            # Un doublon peut être inséré entre-temps par une autre session : conflit sur l'index unique
+            result = e.details
+            for error in result["writeErrors"]:
+                if error["code"] != 11000:
+                    logging.error(f"Erreur lors de l'insertion dans MongoDB : {error['errmsg']}")
+
+    invalidate()
+    inserted = result["nUpserted"] + result["nInserted"]
+    already_present = len(operations) - inserted
+    logging.info(f"{inserted} candidat(s) ajouté(s) à MongoDB, {already_present} déjà présent(s) dans la base.")
+    return {"inserted": inserted, "already_present": already_present}
+
+def get_gemini_response(input_text, max_retries=5, base_wait=30, limiter=None, notify=logging.warning, backend=None,
+                        stats=None):
+    """
+    Génère une réponse en gérant les erreurs de quota (429).
+
+    Args:
+        input_text (str): Texte d'entrée pour le modèle.
+        max_retries (int): Nombre maximum de tentatives avant d'abandonner.
+        base_wait (int): Temps d'attente initial (en secondes) avant le premier retry.
+        limiter (RateLimiter): Limiteur de débit à respecter avant chaque tentative.
+        notify (callable): Fonction appelée avec les messages d'avertissement et d'erreur.
+        backend: Backend d'appel au LLM, par défaut celui du processus (`llm_backend`).
+        stats (dict): Compteur des requêtes envoyées au LLM ("requests"), tentatives comprises.
+
+    Returns:
+        dict: La réponse du modèle sous forme de JSON.
+    """
+    backend = backend or llm_backend
+    stats = stats if stats is not None else {}
+
+    for attempt in range(max_retries):
+        if limiter is not None:
+            waited = limiter.acquire(estimate_tokens(input_text))
+            metrics.emit("import.quota_wait", waited)
+        stats["requests"] = stats.get("requests", 0) + 1
+        try:
+            with metrics.span("import.llm", attempt=attempt + 1, tokens=estimate_tokens(input_text)):
+                # Corriger les backslashes mal échappés
+                response_text = backend.generate(input_text).replace(r"\&", "&")
+
+                return json.loads(response_text)  # Retourne la réponse si tout va bien
+
+        except google.api_core.exceptions.ResourceExhausted:
+            wait_time = base_wait * (2 ** attempt)  # Exponentiel : 30s, 60s, 120s, 240s...
+            metrics.event("import.llm_retry", attempt=attempt + 1, wait=wait_time)
+            notify(f"Quota dépassé. Tentative {attempt + 1}/{max_retries}. Réessai dans {wait_time} secondes...")
+            time.sleep(wait_time)
+
+        except Exception as e:
+            metrics.event("import.llm_error", error=type(e).__name__)
+            notify(f"Erreur inattendue : {e}")
+            return dict(FALLBACK_RESPONSE)  # Valeurs par défaut en cas d'erreur fatale
+
+    notify("Échec après plusieurs tentatives. Veuillez réessayer plus tard.")
+    return dict(FALLBACK_RESPONSE)  # Valeurs par défaut si toutes les tentatives échouent
+
+# Prompt Template
+input_prompt = """
+Tu joues le rôle d'un recruteur data qui doit extraire des informations clés d'un CV.
+Un(e) candidat(e) a envoyé son CV par mail.
+
+Retrouve les  éléments suivants dans le CV :
+- L'année de diplomation
+- La durée totale d'expérience professionnelle cumulée en années
+- Les entreprises associées aux expériences professionnelles (pas celles liées aux stages)
+- Les 5 compétences techniques data clés
+- Si le candidat est freelance ou non.
+
+Je veux une réponse en un seul string ayant la structure suivante :
+{{"Freelance" : "OUI/NON",
+"Année de diplomation": "YYYY",
+"Expérience": "X",
+"Entreprises":"entreprise1, entreprise2, entreprise3",
+"Compétences": "compétence1, compétence2, compétence3, compétence4, compétence5"}}
+
+Pour l'année de diplomation, fais attention car parfois une formation est spécifiée avec les dates de début et de fin.
+Par exemple : 09/2022 - 06/2024 ou bien 2021 à 2022. Dans ces cas-là, il faut aller chercher l'année de fin, c'est-à-dire
+respectivement 2024 et 2022. De plus il peut y avoir plusieurs diplômes, dans ce cas, il faut prendre le plus récent.
+
+Pour la durée d'expérience, merci de ne pas compter les stages ou alternances, seulement les expériences professionnelles.
+Par exemple, si le candidat a travaillé 6 mois en stage et 2 ans et demi en CDI, merci de renvoyer 2,5.
+
+CV: {text}
+"""
+
+
+def get_packed_responses(texts, limiter=None, notify=logging.warning):
+    """
+    Extrait les informations de plusieurs CV en une seule requête (prompt groupé).
+
+    Si la réponse groupée est lisible, seuls les CV sans réponse complète sont renvoyés au LLM, en deux
+    paquets de moitié taille, jusqu'à revenir à un CV par requête (prompt individuel `input_prompt`).
+    Si le LLM n'a pas répondu du tout (quota épuisé, erreur réseau, JSON invalide), le paquet n'est pas
+    redécoupé : chaque CV reçoit `FALLBACK_RESPONSE` (mail en erreur, voir `process_mails`).
+
+    Args:
+        texts (dict): Textes anonymisés des CV, par identifiant.
+        limiter (RateLimiter): Limiteur de débit à respecter avant chaque requête.
+        notify (callable): Fonction appelée avec les messages d'avertissement et d'erreur.
+
+    Returns:
+        tuple: La réponse du modèle et le prompt utilisé (`input_prompt` ou `packed_prompt`), pour chaque
+               identifiant de `texts`, et le nombre de requêtes envoyées au LLM.
+    """
+    responses = {}
+    stats = {"requests": 0}
+    groups = [texts]
+    while groups:
+        group = groups.pop()
+        if len(group) == 1:
+            (cv_id, text), = group.items()
+            response = get_gemini_response(input_prompt.format(text=text), limiter=limiter, notify=notify, stats=stats)
+            responses[cv_id] = (response, input_prompt)
+            continue
+
+        response = get_gemini_response(build_packed_prompt(group), limiter=limiter, notify=notify, stats=stats)
+        if response == FALLBACK_RESPONSE:  # Pas de réponse : redécouper multiplierait les requêtes vouées à l'échec
+            responses.update({cv_id: (dict(FALLBACK_RESPONSE), packed_prompt) for cv_id in group})
+            continue
+        packed = parse_packed_response(response)
+        failed = [cv_id for cv_id in group if cv_id not in packed]
+        responses.update({cv_id: (packed[cv_id], packed_prompt) for cv_id in group if cv_id in packed})
+        if failed:
+            metrics.event("import.llm_split", failed=len(failed), cvs=len(group))
+            logging.info(f"{len(failed)} CV sur {len(group)} sans réponse complète, nouvel essai par paquets plus petits.")
+            half = (len(failed) + 1) // 2
+            groups += [{cv_id: group[cv_id] for cv_id in ids} for ids in (failed[:half], failed[half:]) if ids]
+    return responses, stats["requests"]
+
+
+def cache_keys(text):
+    """
+    Clés de cache d'un CV anonymisé, pour chacun des prompts qui peuvent l'avoir analysé
+    (prompt individuel ou groupé) : la modification d'un prompt n'invalide que ses propres réponses.
+    Le nom du backend (modèle Gemini ou LLM factice) fait partie de la clé.
+    """
+    return {prompt: cache_key(text, prompt, llm_backend.name) for prompt in (input_prompt, packed_prompt)}
+
+
+def parse_filename(filename):
+    """Nom du job et fragments du nom du candidat, d'après le nom du fichier .msg."""
+    # Extraire le job depuis le nom de l'email
+    match = re.search(r'application_ (.*?) from', filename)
+    job_name = match.group(1) if match else "Inconnu"
+
+    # Extract names from the email
+    email_name = filename.split("from")[1].split(".msg")[0] if "from" in filename else "Inconnu"
+    return job_name, email_name.split()
+
+
+def prepare_mail(filename, msg_bytes):
+    """
+    Lit un mail de candidature et prépare le candidat avec ses valeurs par défaut.
+
+    Returns:
+        tuple: Le candidat (dict, avec le CV binaire dans "CV" s'il a été trouvé), le titre LinkedIn,
+               le texte anonymisé et compacté du CV à envoyer au LLM (chaîne vide si le CV est absent ou
+               est une image), et le nombre de tokens du texte avant et après compaction (None sans texte).
+    """
+    job_name, noms_from_email = parse_filename(filename)
+    logging.info(f"Processing: {filename}, noms de l'email : {noms_from_email}")
+
+    with metrics.span("import.msg_parse", bytes=len(msg_bytes)):
+        msg = extract_msg.Message(io.BytesIO(msg_bytes))
+
+    # Extract LinkedIn title and LinkedIn address
+    title, address = extract_linkedin_infos(msg)
+
+    # Valeurs par défaut, complétées par le LLM si le CV est exploitable
+    candidate = {
+        "Date": msg.date,
+        "Job": job_name,
+        "Nom": " ".join(noms_from_email),
+        "Titre LinkedIn": title,
+        "Adresse": address,
+        "Mail": "N/A",
+        "Téléphone": "N/A",
+        "Freelance": "OUI" if "freelance" in title.lower() else "N/A",
+        "Diplôme": "N/A",
+        "Expérience": -1,
+        "Entreprises": "N/A",
+        "Compétences Tech": "N/A",
+        "Statut": 0,  # Default value (= "Non traité")
+    }
+
+    # Resume extraction (en mémoire, sans passer par le disque)
+    resume = getResume(msg)
+    if not resume:
+        logging.error(f"Skipping email {filename}, no valid CV found.")
+        return candidate, title, "", None
+
+    resume_name, resume_file = resume
+    with resume_file:
+        _, extension = os.path.splitext(resume_name)
+        if extension == ".pdf":
+            text_cv = extract_text_from_pdf(resume_file, keep_lines=True)
+        elif extension == ".docx":
+            text_cv = extract_text_from_docx(resume_file, keep_lines=True)
+
+        # Pour le rajout du CV : extraction en binaire
+        resume_file.seek(0)
+        candidate["CV"] = Binary(resume_file.read())
+
+    # Mail + phone extraction, and anonymization
+    text_anonymise, extracted_email, extracted_phone = anonymize_cv(
+        text_cv, [name for name in noms_from_email if len(name) > 2]
+    )
+    if not text_anonymise:  # Le texte est vide si le PDF est une image
+        return candidate, title, "", None
+
+    candidate["Mail"] = extracted_email
+    candidate["Téléphone"] = extracted_phone
+
+    # Retrait du bruit (en-têtes répétés, cellules fusionnées...) et des sections superflues au-delà du budget
+    with metrics.span("import.compact") as span:
+        text_compact, tokens = compact_cv(text_anonymise, CV_TOKEN_BUDGET)
+        span.set(**tokens)
+    logging.info(f"{filename} : {tokens['before']} tokens, {tokens['after']} après compaction.")
+    return candidate, title, text_compact, tokens
+
+
+def stored_cv_text(candidate):
+    """
+    Texte anonymisé et compacté du CV enregistré d'une candidature, comme à l'import (chaîne vide si
+    le CV n'a pas été enregistré ou n'est pas lisible). Sert à calculer l'empreinte des candidatures
+    importées avant la détection des doublons (voir identities.link_all).
+    """
+    cv = load_cv(candidate)
+    extension = guess_extension(cv) if cv else None
+    if extension not in ("pdf", "docx"):
+        return ""
+    try:
+        with io.BytesIO(cv) as resume_file:
+            if extension == "pdf":
+                text_cv = extract_text_from_pdf(resume_file, keep_lines=True)
+            else:
+                text_cv = extract_text_from_docx(resume_file, keep_lines=True)
+    except Exception as e:
+        logging.warning(f"CV de {candidate.get('Nom')} illisible : {e}")
+        return ""
+
+    text_anonymise, _, _ = anonymize_cv(text_cv, [name for name in candidate.get("Nom", "").split() if len(name) > 2])
+    if not text_anonymise:
+        return ""
+    return compact_cv(text_anonymise, CV_TOKEN_BUDGET)[0]
+
+
+def _to_float(value):
+    """Convertit l'expérience renvoyée par le LLM ("2,5" par exemple) en nombre."""
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        return -1.0
+
+
+def apply_response(candidate, title, response):
+    """Complète le candidat avec la réponse du LLM."""
+    # Check if we have all fields in LLM response
+    response = validate_llm_response(response)
+
+    # Check for a "freelance" mention in LinkedIn title
+    candidate.update(
+        {
+            "Freelance": "OUI" if "freelance" in title.lower() else response["Freelance"],
+            "Diplôme": response["Année de diplomation"],
+            "Expérience": _to_float(response["Expérience"]),
+            "Entreprises": response["Entreprises"],
+            "Compétences Tech": response["Compétences"],
+            # Réponse brute, réutilisée pour les CV presque identiques (sans l'effet du titre LinkedIn)
+            "llm_response": dict(response),
+        }
+    )
+    return candidate
+
+
+def process_mails(mails, cache, max_workers=GEMINI_MAX_WORKERS, notify=logging.warning, initializer=None, limiter=None,
+                  skip_processed=True, pack_size=GEMINI_PACK_SIZE):
+    """
+    Traite des mails de candidature. Les appels au LLM partent en parallèle (dans la limite du quota)
+    pendant que la lecture des mails suivants continue. Les CV sont envoyés au LLM par paquets
+    de `pack_size` CV (dans la limite de `GEMINI_PACK_MAX_TOKENS` tokens par requête).
+
+    Chaque candidat est rattaché à l'identité d'une candidature de la même personne (déjà enregistrée
+    ou de ce même import), s'il y en a une (voir identities.py). Si son CV est presque identique à celui
+    d'une candidature déjà analysée, l'extraction de celle-ci est réutilisée sans appel au LLM.
+
+    Un mail dont le CV n'a pas pu être analysé (le LLM n'a pas répondu) est en erreur : il n'est ni
+    enregistré ni inscrit au journal, et sera retraité au prochain import.
+
+    Args:
+        mails (iterable): Couples (nom du fichier .msg, contenu), lus au fur et à mesure.
+        cache (ExtractionCache): Cache des réponses du LLM.
+        max_workers (int): Nombre maximum d'appels simultanés au LLM.
+        notify (callable): Fonction appelée avec les avertissements (quota dépassé, erreurs du LLM).
+        initializer (callable): Fonction exécutée au démarrage de chaque thread d'appel au LLM.
+        limiter (RateLimiter): Limiteur de débit, par défaut le quota partagé de la clé d'API (`gemini_limiter`).
+        skip_processed (bool): Ignorer les mails déjà présents dans le journal des imports.
+        pack_size (int): Nombre maximum de CV par requête au LLM (1 : un CV par requête).
+
+    Yields:
+        dict: Un résultat par mail, dès qu'il est terminé : "index" (position du mail dans `mails`), "filename",
+              "hash" (empreinte du .msg), "candidate" (None en cas d'erreur ou si le mail a déjà été importé),
+              "tokens" (tokens du CV avant et après compaction, ou None), "error", "source" ("llm", "cache",
+              "duplicate" si l'extraction d'un CV presque identique a été réutilisée, "journal" si le mail
+              a déjà été importé, ou "none" si le LLM n'a pas été sollicité) et "llm_calls" (requêtes envoyées
+              au LLM, comptées sur le premier CV de chaque paquet : leur somme est le nombre total de requêtes).
+
+        Les candidats ne sont pas enregistrés : voir `commit_result`.
+    """
+    pending = {}  # Appels au LLM en cours : future -> {identifiant du CV: (résultat, titre LinkedIn, texte, identité)}
+    packer = Packer(pack_size, GEMINI_PACK_MAX_TOKENS)  # CV en attente d'envoi au LLM
+    # Empreinte, identité et extraction des candidats de cet import, qui ne sont pas forcément encore enregistrés
+    batch_index = identities.DuplicateIndex()
+    followers = {}  # Identité d'un CV envoyé au LLM -> CV presque identiques qui attendent sa réponse
+
+    def submit():
+        """Envoie au LLM les CV du paquet en cours."""
+        items = packer.take()
+        future = scheduler.submit({cv_id: text for cv_id, (text, _) in items.items()}, notify=notify)
+        pending[future] = {cv_id: entry for cv_id, (_, entry) in items.items()}
+
+    def send(result, title, text, record):
+        """Ajoute un CV au paquet en cours, envoyé au LLM dès qu'il est plein."""
+        result["source"] = "llm"
+        followers[id(record)] = []
+        if not packer.fits(text):
+            submit()
+        packer.add(str(result["index"]), text, (result, title, text, record))
+        if packer.full():
+            submit()
+
+    def extracted(result, title, response, record):
+        """Complète le candidat avec la réponse du LLM et la reporte dans l'index des candidats de l'import."""
+        result["candidate"] = apply_response(result["candidate"], title, response)
+        record["llm_response"] = result["candidate"]["llm_response"]
+        return result
+
+    def complete(future):
+        """Met en cache les réponses du LLM une fois l'appel terminé, puis complète les candidats."""
+        entries = pending.pop(future)
+        responses, requests = future.result()
+        for cv_id, (result, title, text, record) in entries.items():
+            result["llm_calls"], requests = requests, 0
+            response, prompt = responses[cv_id]
+            logging.info(f"Réponse : {response}")
+
+            # On ne met en cache (et ne transmet aux CV presque identiques) que les réponses complètes,
+            # pas les valeurs par défaut en cas d'erreur ; en cache, sous la clé du prompt qui les a produites
+            complete_response = LLM_REQUIRED_FIELDS.keys() <= response.keys()
+            if complete_response:
+                cache.set(cache_keys(text)[prompt], dict(response))
+            if response == FALLBACK_RESPONSE:  # Pas de réponse du LLM : le mail sera retraité au prochain import
+                yield dict(result, candidate=None, error="Le LLM n'a pas répondu (quota épuisé, erreur réseau ou réponse invalide).")
+            else:
+                yield extracted(result, title, response, record)
+
+            # Groupe des CV presque identiques, enregistré sous l'identité de chacun de ses membres
+            group = followers.get(id(record), [])
+            for key in [key for key, waiting in followers.items() if waiting is group]:
+                del followers[key]
+            if complete_response:
+                for follower, follower_title, _, follower_record in group:
+                    yield extracted(follower, follower_title, response, follower_record)
+            elif group:
+                # Le CV de référence n'a pas pu être analysé : le premier CV presque identique est envoyé
+                # au LLM à sa place, les autres (et ceux qui arriveront) attendent sa réponse
+                (leader, leader_title, leader_text, leader_record), *others = group
+                send(leader, leader_title, leader_text, leader_record)
+                followers[id(leader_record)] += others
+                for member in [record] + [follower_record for _, _, _, follower_record in others]:
+                    followers[id(member)] = followers[id(leader_record)]
+
+    scheduler = LLMScheduler(get_packed_responses, limiter or gemini_limiter, max_workers=max_workers, initializer=initializer)
+    with scheduler:
+        for index, (filename, msg_bytes) in enumerate(mails):
+            result = {"index": index, "filename": filename, "hash": journal.mail_hash(msg_bytes),
+                      "candidate": None, "tokens": None, "error": None, "source": "none", "llm_calls": 0}
+
+            if skip_processed and journal.is_processed(result["hash"]):
+                logging.info(f"{filename} déjà importé, ignoré.")
+                yield dict(result, source="journal")
+                continue
+
+            try:
+                with metrics.document(filename), metrics.span("import.prepare"):
+                    candidate, title, text_anonymise, result["tokens"] = prepare_mail(filename, msg_bytes)
+            except Exception as e:
+                logging.exception(f"Erreur lors de la lecture de {filename}")
+                yield dict(result, error=str(e))
+                continue
+
+            result["candidate"] = candidate
+            candidate["dedup"] = identities.fingerprint(candidate, text_anonymise)
+            match, text_similarity = identities.best_match(
+                candidate["dedup"], batch_index.query(candidate["dedup"]) + identities.lookup(collection, candidate["dedup"])
+            )
+            candidate["identity_id"] = match["identity_id"] if match else ObjectId()
+            record = {"dedup": candidate["dedup"], "identity_id": candidate["identity_id"]}
+            batch_index.add(candidate["dedup"], record)
+
+            same_cv = bool(text_anonymise) and match is not None and text_similarity >= identities.REUSE_THRESHOLD
+            previous = identities.extraction(match) if same_cv else None
+            if not text_anonymise:
+                yield result
+            elif previous is not None:  # CV presque identique déjà analysé : pas d'appel au LLM
+                result["source"] = "duplicate"
+                yield extracted(result, title, previous, record)
+            elif same_cv and id(match) in followers:  # CV presque identique en cours d'analyse
+                result["source"] = "duplicate"
+                followers[id(match)].append((result, title, text_anonymise, record))
+                followers[id(record)] = followers[id(match)]
+            else:
+                # Si le CV a du contenu, on le fournit au LLM
+                cached_response = cache.get_any(list(cache_keys(text_anonymise).values()))
+                if cached_response is not None:  # Pas d'appel ni d'attente de quota
+                    result["source"] = "cache"
+                    yield extracted(result, title, cached_response, record)
+                else:
+                    send(result, title, text_anonymise, record)
+
+            # Résultats des appels déjà terminés
+            for future in [f for f in pending if f.done()]:
+                yield from complete(future)
+
+        # Envoi du dernier paquet, puis attente des derniers appels au LLM (qui peuvent en renvoyer d'autres)
+        while packer.items or pending:
+            if packer.items:
+                submit()
+            for future in as_completed(list(pending)):
+                yield from complete(future)
+    cache.evict()
+
+
+def store_candidates(candidates, store_cv):
+    """
+    Enregistre les candidats : les CV sont stockés à part (cv_blobs) et la candidature ne garde
+    qu'une référence. Le champ CV est ignoré si `store_cv` est faux.
+    """
+    candidates = [dict(candidate) for candidate in candidates]
+    cvs = [candidate.pop("CV", None) for candidate in candidates]
+    if store_cv:
+        with_cv = [(candidate, cv) for candidate, cv in zip(candidates, cvs) if isinstance(cv, bytes)]
+        refs = store_blobs([cv for _, cv in with_cv])
+        for (candidate, _), ref in zip(with_cv, refs):
+            candidate["CV_ref"] = ref
+    return insert_into_mongo(candidates)
+
+
+def commit_result(result, store_cv):
+    """
+    Enregistre immédiatement le candidat d'un mail traité, puis inscrit le mail au journal des imports.
+    Un mail en erreur n'est pas inscrit : il sera retraité au prochain import.
+    """
+    if not result["candidate"]:
+        return {"inserted": 0, "already_present": 0}
+    with metrics.document(result["filename"]), metrics.span("import.commit"):
+        counts = store_candidates([result["candidate"]], store_cv)
+        journal.record(result["hash"], result["filename"], result["candidate"], result["tokens"])
+    return counts
@@ -0,0 +1,143 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument
+
+
+def estimate_tokens(text, output_tokens=300):
+    """
+    Estimation grossière du nombre de tokens consommés par une requête
+    (~4 caractères par token pour le prompt, plus une marge pour la réponse).
+    """
+    return len(text) // 4 + output_tokens
+
+
+class TokenBucket:
+    """
+    Seau à jetons : `capacity` jetons maximum, rechargé de `rate` jetons par seconde.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Temps (en secondes) avant que `amount` jetons soient disponibles."""
+        self._refill()
+        amount = min(amount, self.capacity)  # Une requête trop grosse ne doit pas bloquer indéfiniment
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Limiteur partagé entre threads, basé sur deux seaux : requêtes par minute (RPM)
+    et tokens par minute (TPM).
+
+    Args:
+        rpm (int): Nombre de requêtes autorisées par minute.
+        tpm (int): Nombre de tokens autorisés par minute.
+        burst (int): Nombre de requêtes pouvant partir d'un coup. Une valeur faible
+                     évite de dépasser le quota sur une fenêtre glissante d'une minute.
+    """
+
+    def __init__(self, rpm, tpm, burst=1):
+        self.requests = TokenBucket(burst, rpm / 60)
+        self.tokens = TokenBucket(tpm, tpm / 60)
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """Bloque jusqu'à ce qu'une requête de `tokens` tokens puisse partir, et retourne le temps attendu."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait == 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class SharedRateLimiter:
+    """
+    Limiteur partagé entre processus (application, workers, import en ligne de commande) par un document
+    MongoDB : le quota Gemini est lié à la clé d'API, pas au processus.
+
+    Chaque requête réserve atomiquement son créneau (algorithme GCRA) : le document contient, pour les
+    requêtes et pour les tokens, l'instant où le quota sera de nouveau entièrement libre ; la requête
+    attend le temps nécessaire pour que sa réservation tienne dans le quota. Les horloges des machines
+    doivent être synchronisées (NTP).
+
+    Args:
+        collection: Collection MongoDB des quotas.
+        key (str): Identifiant du quota (un document par clé d'API ou backend).
+        rpm (int): Nombre de requêtes autorisées par minute.
+        tpm (int): Nombre de tokens autorisés par minute.
+        burst (int): Nombre de requêtes pouvant partir d'un coup (voir `RateLimiter`).
+    """
+
+    def __init__(self, collection, key, rpm, tpm, burst=1):
+        self.collection = collection
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst = burst
+
+    def acquire(self, tokens=0):
+        """Réserve le créneau d'une requête de `tokens` tokens, attend qu'il arrive et retourne le temps attendu."""
+        now = time.time()
+        costs = {"requests": 60 / self.rpm, "tokens": min(tokens, self.tpm) * 60 / self.tpm}
+        quota = self.collection.find_one_and_update(
+            {"_id": self.key},
+            [{"$set": {
+                field: {"$add": [{"$max": [f"${field}", now]}, cost]}
+                for field, cost in costs.items()
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        # Le seau des requêtes contient `burst` requêtes, celui des tokens une minute de quota
+        wait = max(quota["requests"] - self.burst * costs["requests"], quota["tokens"] - 60) - now
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+
+class LLMScheduler:
+    """
+    Exécute les appels au LLM en parallèle dans un pool de threads, chaque tentative
+    passant par le `RateLimiter` partagé.
+
+    Args:
+        fn (callable): Fonction d'appel au LLM, appelée avec `fn(prompt, limiter=limiter, **kwargs)`.
+        limiter (RateLimiter): Limiteur de débit à respecter.
+        max_workers (int): Nombre maximum d'appels simultanés.
+        initializer (callable): Fonction exécutée au démarrage de chaque thread.
+    """
+
+    def __init__(self, fn, limiter, max_workers=5, initializer=None):
+        self.fn = fn
+        self.limiter = limiter
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, initializer=initializer)
+
+    def submit(self, prompt, **kwargs):
+        return self.executor.submit(self.fn, prompt, limiter=self.limiter, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True)
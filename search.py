@@ -0,0 +1,128 @@
+"""
+Recherche plein texte sur les candidatures.
+
+Chaque document porte un champ `search_tokens` (index multiclé) contenant, pour chaque champ
+recherchable, les préfixes des mots normalisés (minuscules, sans accents) sous la forme
+"<champ>:<préfixe>". Une recherche devient ainsi une suite d'égalités sur un index, quel que soit
+le nombre de candidatures, au lieu d'une regex insensible à la casse qui parcourt toute la collection.
+
+Les documents sans `search_tokens` (importés avant la recherche indexée) sont indexés automatiquement
+à la première connexion à la base de chaque processus (`reindex_missing`). Le module peut aussi être
+lancé (`python -m search`) pour réindexer tous les documents.
+"""
+import logging
+import re
+import unicodedata
+from pymongo import UpdateOne
+
+# Champs recherchables : code court utilisé dans les tokens et poids dans le score de pertinence
+SEARCHABLE_FIELDS = {
+    "Nom": ("nom", 5),
+    "Titre LinkedIn": ("titre", 3),
+    "Compétences Tech": ("comp", 3),
+    "Entreprises": ("ent", 2),
+    "Adresse": ("adr", 1),
+}
+
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 15
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Met le texte en minuscules, supprime les accents et le découpe en mots."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return WORD_PATTERN.findall(text)
+
+
+def prefixes(word):
+    if len(word) <= MIN_PREFIX_LENGTH:
+        return [word]
+    return [word[:size] for size in range(MIN_PREFIX_LENGTH, min(len(word), MAX_PREFIX_LENGTH) + 1)]
+
+
+def build_search_tokens(document):
+    """Tokens de recherche d'un document (à stocker dans `search_tokens`)."""
+    tokens = set()
+    for field, (code, _) in SEARCHABLE_FIELDS.items():
+        value = document.get(field)
+        if not isinstance(value, str):
+            continue
+        for word in normalize(value):
+            tokens.update(f"{code}:{prefix}" for prefix in prefixes(word))
+    return sorted(tokens)
+
+
+def query_terms(search_query):
+    """Mots de la recherche, tronqués à la longueur maximale des préfixes indexés."""
+    return [word[:MAX_PREFIX_LENGTH] for word in normalize(search_query)]
+
+
+def search_filter(search_query, fields=None):
+    """
+    Filtre MongoDB correspondant à une recherche : chaque mot doit être le début d'un mot
+    de l'un des champs demandés (tous les champs recherchables par défaut).
+    """
+    codes = [SEARCHABLE_FIELDS[field][0] for field in fields or SEARCHABLE_FIELDS]
+    conditions = [
+        {"search_tokens": {"$in": [f"{code}:{term}" for code in codes]}}
+        for term in query_terms(search_query)
+    ]
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def relevance_score(search_query, fields=None):
+    """
+    Expression d'agrégation du score de pertinence : somme, pour chaque champ, du poids du champ
+    multiplié par le nombre de mots de la recherche qui y sont trouvés (None si la recherche ne
+    contient aucun mot : pas de tri par pertinence).
+    """
+    terms = query_terms(search_query)
+    if not terms:
+        return None
+    return {
+        "$add": [
+            {
+                "$multiply": [
+                    weight,
+                    {"$size": {"$setIntersection": [
+                        {"$ifNull": ["$search_tokens", []]}, [f"{code}:{term}" for term in terms]
+                    ]}},
+                ]
+            }
+            for code, weight in (SEARCHABLE_FIELDS[field] for field in fields or SEARCHABLE_FIELDS)
+        ]
+    }
+
+
+def reindex_all(collection, batch_size=500, query=None):
+    """(Re)calcule `search_tokens` pour tous les documents de la collection (ou ceux de `query`)."""
+    projection = {field: 1 for field in SEARCHABLE_FIELDS}
+    operations = []
+    updated = 0
+    for document in collection.find(query or {}, projection):
+        operations.append(UpdateOne({"_id": document["_id"]}, {"$set": {"search_tokens": build_search_tokens(document)}}))
+        if len(operations) == batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+def reindex_missing(collection):
+    """Indexe les documents qui n'ont pas encore de `search_tokens` (importés avant la recherche indexée)."""
+    updated = reindex_all(collection, query={"search_tokens": {"$exists": False}})
+    if updated:
+        logging.info(f"{updated} candidature(s) ajoutée(s) à l'index de recherche.")
+    return updated
+
+
+if __name__ == "__main__":
+    from config import collection
+
+    print(f"{reindex_all(collection)} candidature(s) indexée(s).")
@@ -1,76 +1,109 @@
 import streamlit as st
 import pandas as pd
 from config import collection
+from cache import job_list
+import metrics
+
+# Dimensions temporelles : unité de $dateTrunc et format d'affichage
+TIME_DIMENSIONS = {
+    "Année": ("year", "%Y"),
+    "Mois": ("month", "%Y-%m"),  # Ex: 2024-03
+    "Jour": ("day", "%Y-%m-%d"),  # Ex: 2024-03-06
+}
+
+def count_by(group_id, dated_only=False):
+    """Étapes d'agrégation comptant les candidatures par `group_id`."""
+    stages = [{"$match": {"Date": {"$type": "date"}}}] if dated_only else []
+    return stages + [
+        {"$group": {"_id": group_id, "Nombre de candidatures": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+@metrics.timed("mongo.stats")
+def get_stats(match, time_dimension):
+    """
+    Calcule côté MongoDB, en un seul aller-retour ($facet), le nombre de candidatures
+    par jour, par mois, par année et par job (éventuellement par job et par période).
+    """
+    facets = {
+        dimension: count_by({"$dateTrunc": {"date": "$Date", "unit": unit}}, dated_only=True)
+        for dimension, (unit, _) in TIME_DIMENSIONS.items()
+    }
+    if time_dimension in TIME_DIMENSIONS:
+        unit = TIME_DIMENSIONS[time_dimension][0]
+        facets["Job"] = count_by({"Job": "$Job", time_dimension: {"$dateTrunc": {"date": "$Date", "unit": unit}}}, dated_only=True)
+    else:
+        facets["Job"] = count_by({"Job": "$Job"})
 
-def stats_page():
-    st.title("Statistiques des candidatures")
-
-    # Récupérer les données (en supposant que "Date" est au format Date)
-    data = list(collection.find({}, {"_id": 0, "Job": 1, "Date": 1}))
-
-    # Transformer en DataFrame Pandas
-    df = pd.DataFrame(data)
+    return next(collection.aggregate([{"$match": match}, {"$facet": facets}]))
 
-    # Vérifier la colonne date et la convertir
+def to_dataframe(buckets, dimension):
+    """Convertit les buckets d'une dimension temporelle en DataFrame indexée par période."""
+    df = pd.DataFrame(
+        {dimension: [bucket["_id"] for bucket in buckets],
+         "Nombre de candidatures": [bucket["Nombre de candidatures"] for bucket in buckets]}
+    )
     if not df.empty:
-        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        df[dimension] = pd.to_datetime(df[dimension]).dt.strftime(TIME_DIMENSIONS[dimension][1])
+    return df.set_index(dimension)
 
-        # Ajouter les dimensions temporelles
-        df["Année"] = df["Date"].dt.year
-        df["Mois"] = df["Date"].dt.strftime("%Y-%m")  # Ex: 2024-03
-        df["Jour"] = df["Date"].dt.strftime("%Y-%m-%d")  # Ex: 2024-03-06
+def stats_page():
+    st.title("Statistiques des candidatures")
+
+    if collection.estimated_document_count() > 0:
 
         # Affichage des stats
         st.subheader("Définition des filtres")
 
-        # No filter by default 
-        df_filtered = df.copy()
-
         # Filtrage : Job + Groupe temporel + Période
         col1, col2, col3 = st.columns(3)  # Ajustement des largeurs
         with col1:
             date_fourchette = st.date_input("📅 Période de candidature", value=[], format="DD/MM/YYYY")
 
         with col2:
-            unique_jobs = ["Tous"] + sorted(df["Job"].dropna().unique())
+            unique_jobs = ["Tous"] + sorted(job for job in job_list() if job is not None)
             selected_job = st.selectbox("Job Desc :", unique_jobs)
 
         with col3:
             time_dimension = st.selectbox("Grouper par :", ["Ne pas grouper (nombre total)", "Année", "Mois", "Jour"], index=0)
-            
 
-        # Appliquer le filtre par Job
+        # Filtres appliqués côté MongoDB ($match)
+        match = {}
         if selected_job != "Tous":
-            df_filtered = df[df["Job"] == selected_job]
+            match["Job"] = selected_job
 
         # Appliquer le filtre temporel si une période est sélectionnée
         if len(date_fourchette) == 2:
             start_date, end_date = date_fourchette
             end_date = pd.Timestamp(end_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-            df_filtered = df_filtered[(df_filtered["Date"] >= pd.Timestamp(start_date)) & (df_filtered["Date"] <= end_date)]
-
-        # Application du groupby selon la dimension temporelle
-        if time_dimension == "Ne pas grouper (nombre total)":
-            count_by_job = df_filtered["Job"].value_counts().reset_index()
-            count_by_job.columns = ["Job", "Nombre de candidatures"]
+            match["Date"] = {"$gte": pd.Timestamp(start_date), "$lte": end_date}
+
+        stats = get_stats(match, time_dimension)
+
+        # Nombre de candidatures par job (et par période si demandé)
+        count_by_job = pd.DataFrame(
+            [{**bucket["_id"], "Nombre de candidatures": bucket["Nombre de candidatures"]} for bucket in stats["Job"]]
+        )
+        if count_by_job.empty:
+            count_by_job = pd.DataFrame(columns=["Job", "Nombre de candidatures"])
+        elif time_dimension in TIME_DIMENSIONS:
+            count_by_job[time_dimension] = pd.to_datetime(count_by_job[time_dimension]).dt.strftime(
+                TIME_DIMENSIONS[time_dimension][1]
+            )
         else:
-            count_by_job = df_filtered.groupby(["Job", time_dimension]).size().reset_index(name="Nombre de candidatures")
+            count_by_job = count_by_job.sort_values("Nombre de candidatures", ascending=False)
 
         st.dataframe(count_by_job, hide_index=True)
 
         # Graphiques après filtrage
-        count_by_year = df_filtered.groupby("Année").size().reset_index(name="Nombre de candidatures")
-        count_by_month = df_filtered.groupby("Mois").size().reset_index(name="Nombre de candidatures")
-        count_by_day = df_filtered.groupby("Jour").size().reset_index(name="Nombre de candidatures")
-
         st.subheader("📆 Candidatures par jour")
-        st.area_chart(count_by_day.set_index("Jour"))
+        st.area_chart(to_dataframe(stats["Jour"], "Jour"))
 
         st.subheader("📆 Candidatures par mois")
-        st.line_chart(count_by_month.set_index("Mois"))
+        st.line_chart(to_dataframe(stats["Mois"], "Mois"))
 
         st.subheader("📅 Candidatures par année")
-        st.bar_chart(count_by_year.set_index("Année"))
+        st.bar_chart(to_dataframe(stats["Année"], "Année"))
 
     else:
         st.warning("Aucune donnée disponible.")
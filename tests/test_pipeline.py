@@ -0,0 +1,128 @@
+"""
+Tests du pipeline d'import sur une base MongoDB en mémoire (mongomock) et un LLM factice.
+
+Usage : python -m pytest tests
+"""
+import logging
+
+import pytest
+
+import metrics
+from benchmarks.bench_pipeline import load_pipeline
+from benchmarks.corpus import generate
+
+
+@pytest.fixture(scope="module")
+def env():
+    logging.disable(logging.CRITICAL)
+    metrics.disable()
+    config, pipeline = load_pipeline()
+    yield config, pipeline
+    metrics.enable()
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture(scope="module")
+def mails(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("corpus")
+    generate(folder, 6, seed=0)
+    return [(path.name, path.read_bytes()) for path in sorted(folder.glob("*.msg"))]
+
+
+def run(config, pipeline, mails, backend, reset=True, **kwargs):
+    from llm_cache import ExtractionCache
+    from rate_limit import RateLimiter
+
+    if reset:
+        for collection in (config.collection, config.cache_collection, config.blob_collection, config.journal_collection):
+            collection.delete_many({})
+    pipeline.llm_backend = backend
+    cache = ExtractionCache(config.cache_collection, config.LLM_CACHE_TTL_DAYS, config.LLM_CACHE_MAX_ENTRIES)
+    limiter = RateLimiter(10**6, 10**12, burst=10**6)
+    return list(pipeline.process_mails(mails, cache, limiter=limiter, **kwargs))
+
+
+def test_malformed_llm_response_is_an_error(env, mails):
+    from llm_backends import FakeBackend
+
+    config, pipeline = env
+    # Première réponse au JSON tronqué, les suivantes valides
+    backend = FakeBackend(script=["malformed"])
+    metrics.enable()  # L'erreur est enregistrée dans les mesures
+    try:
+        results = run(config, pipeline, mails, backend, pack_size=1)
+        metrics.flush()
+    finally:
+        metrics.disable()
+
+    assert len(results) == len(mails)
+    failed, = [result for result in results if result["error"]]
+    assert failed["candidate"] is None
+    assert config.metrics_collection.count_documents({"stage": "import.llm_error", "error": "JSONDecodeError"}) == 1
+    # Les valeurs par défaut ne sont pas mises en cache
+    analysed = [result for result in results if result["source"] == "llm" and not result["error"]]
+    assert config.cache_collection.count_documents({}) == len(analysed)
+    assert sum(result["llm_calls"] for result in results) == backend.calls
+
+
+def test_duplicate_cv_is_sent_to_llm_when_its_leader_failed(env, mails):
+    from llm_backends import FakeBackend
+
+    config, pipeline = env
+    filename, msg_bytes = next(
+        (name, data) for name, data in mails if run(config, pipeline, [(name, data)], FakeBackend())[0]["source"] == "llm"
+    )
+    duplicates = [(filename.replace("application_ ", f"application_ Offre {i} "), msg_bytes) for i in range(2)]
+    backend = FakeBackend(script=["malformed"])
+    results = run(config, pipeline, [(filename, msg_bytes)] + duplicates, backend, pack_size=1)
+
+    leader, follower, other = sorted(results, key=lambda result: result["index"])
+    assert leader["error"] and leader["candidate"] is None
+    # Le premier CV presque identique est envoyé au LLM à la place du CV de référence, l'autre attend sa réponse
+    assert follower["source"] == "llm"
+    assert follower["candidate"]["Diplôme"] != "N/A"
+    assert other["source"] == "duplicate"
+    assert other["candidate"]["llm_response"] == follower["candidate"]["llm_response"]
+    assert backend.calls == 2
+
+
+def test_duplicate_cv_reuses_the_raw_llm_response(env, mails):
+    from llm_backends import FakeBackend
+
+    config, pipeline = env
+    leader, filename, msg_bytes = next(
+        (result, name, data) for name, data in mails
+        for result in run(config, pipeline, [(name, data)], FakeBackend())
+        if result["source"] == "llm" and result["candidate"]["Freelance"] != "OUI"
+    )
+    # Candidature enregistrée avec un champ Freelance forcé par son titre LinkedIn
+    pipeline.commit_result(dict(leader, candidate=dict(leader["candidate"], Freelance="OUI")), store_cv=False)
+
+    duplicate = (filename.replace("application_ ", "application_ Autre offre "), msg_bytes)
+    follower, = run(config, pipeline, [duplicate], FakeBackend(), reset=False, skip_processed=False)
+    assert follower["source"] == "duplicate"
+    assert follower["candidate"]["llm_response"] == leader["candidate"]["llm_response"]
+    assert follower["candidate"]["Freelance"] == leader["candidate"]["Freelance"]
+
+def test_mails_of_a_failed_pack_are_retried_on_next_import(env, tmp_path):
+    from llm_backends import FakeBackend
+
+    config, pipeline = env
+    generate(tmp_path, 16, seed=1)
+    mails = [(path.name, path.read_bytes()) for path in sorted(tmp_path.glob("*.msg"))]
+
+    # Le premier paquet de 8 CV reçoit une réponse invalide : ses mails sont en erreur
+    results = run(config, pipeline, mails, FakeBackend(script=["malformed"]), pack_size=8)
+    for result in results:
+        pipeline.commit_result(result, store_cv=False)
+    failed = {result["filename"] for result in results if result["error"]}
+    assert len(failed) == 8
+    assert config.journal_collection.count_documents({}) == len(mails) - len(failed)
+
+    # Ils ne sont pas inscrits au journal : le prochain import les retraite, et seulement eux
+    results = run(config, pipeline, mails, FakeBackend(), reset=False, pack_size=8)
+    for result in results:
+        pipeline.commit_result(result, store_cv=False)
+    assert not any(result["error"] for result in results)
+    assert {result["filename"] for result in results if result["source"] != "journal"} == failed
+    assert config.journal_collection.count_documents({}) == len(mails)
@@ -1,18 +1,43 @@
 import re
 import os
+import functools
+import io
+import itertools
+import tempfile
+import time
+import threading
+import contextvars
+import concurrent.futures
 import PyPDF2 as pdf
 import pdfplumber
 import logging
-import base64
-from bson.binary import Binary
 from docx import Document
+import metrics
 
-def getResume(msg, cvs_folder):
+# Taille (en octets) au-delà de laquelle une pièce jointe est déportée sur disque
+CV_SPOOL_THRESHOLD = 5 * 1024 * 1024
+
+# Budget d'extraction des PDF : le LLM n'a besoin que du début du CV
+PDF_MAX_PAGES = 6
+PDF_MAX_CHARS = 20_000
+PDF_TIMEOUT = 20  # Secondes par document
+# Qualité minimale du texte extrait par PyPDF2 (voir text_quality), en dessous pdfplumber est essayé
+PDF_MIN_QUALITY = 0.9
+PDF_PUNCTUATION = set(".,;:!?'\"()[]{}-–—/\\@&%+*#€$£°’«»•·|_=<>")
+PDF_ARTIFACT_PATTERN = re.compile(r"\(cid:\d+\)|\ufffd")
+
+
+@metrics.timed("import.resume")
+def getResume(msg, spool_threshold=CV_SPOOL_THRESHOLD):
     """
-    Processes the attachments in the provided message to retrieve a resume.
+    Processes the attachments in the provided message to retrieve a resume, without writing it to disk.
     Args:
         msg: The message object containing attachments.
-        cvs_folder: The folder where the resume should be saved.
+        spool_threshold: Size (in bytes) above which the resume is spooled to a temporary file
+                         instead of being kept in memory.
+    Returns:
+        tuple: The attachment filename and a seekable file object positioned at the start of the resume,
+               or None if no valid resume was found. The caller is responsible for closing the file object.
     Raises:
         ValueError: If an attachment's name is None.
         Exception: If there are no attachments, or if an attachment's extension is not .pdf,
@@ -38,20 +63,11 @@ def getResume(msg, cvs_folder):
                     logging.error(f"Unsupported extension {extension}")
                     return None
 
-                # Temporary save
-                attachment.save(customFilename=attachment.longFilename)
-
-                # Move the file to the correct folder
-                saved_path = os.path.join(os.getcwd(), attachment.longFilename)
-                final_path = os.path.join(cvs_folder, attachment.longFilename)
-
-                # If the file already exists, remove it
-                if os.path.exists(final_path):
-                    logging.info(f"Replacing existing file: {final_path}")
-                    os.remove(final_path)
-
-                os.rename(saved_path, final_path)  # Move the file to the final folder
-                return final_path  # Return the file path
+                # In-memory buffer, spooled to disk only for large attachments
+                resume_file = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+                resume_file.write(attachment.data)
+                resume_file.seek(0)
+                return attachment.longFilename, resume_file
 
         else:
             logging.error("No attachment found")
@@ -89,43 +105,182 @@ def extract_linkedin_infos(message):
     return title, address
 
 
-def extract_text_from_pdf(file):
+def _as_stream(file):
+    """Wraps raw bytes in a BytesIO and rewinds file objects, so that parsers can read them from the start."""
+    if isinstance(file, (bytes, bytearray)):
+        return io.BytesIO(file)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return file
+
+
+def has_text_layer(reader, max_pages=PDF_MAX_PAGES):
     """
-    Extracts text from a PDF file. Using PyPDF2 if possible, otherwise using pdfplumber.
+    Cheap check for a text layer, without parsing the page contents: a page with text declares
+    at least one font, in its own resources or in those of a form XObject.
 
     Args:
-        file (str): The path to the PDF file.
+        reader (PyPDF2.PdfReader): The parsed PDF.
+        max_pages (int): Number of pages to check from the start of the document.
 
     Returns:
-        str: The extracted text from the PDF, with newlines replaced by spaces and leading/trailing whitespace removed.
+        bool: False for an image-only (scanned) PDF.
     """
-    try : 
-        reader = pdf.PdfReader(file)
-        text = ""
-        for _, page in enumerate(reader.pages):
-            text += str(page.extract_text())
-            print('on passe dans le try')
-
-    except :
-        with pdfplumber.open(file) as pdf_p:
-            print('on passe dans lexcept')
-            text = " ".join(page.extract_text() or "" for page in pdf_p.pages)
-        
+    for index in range(min(max_pages, len(reader.pages))):
+        resources = reader.pages[index].get("/Resources")
+        resources = resources.get_object() if resources is not None else {}
+        if "/Font" in resources:
+            return True
+        xobjects = resources.get("/XObject")
+        for xobject in (xobjects.get_object().values() if xobjects is not None else []):
+            xobject = xobject.get_object()
+            form_resources = xobject.get("/Resources")
+            form_resources = form_resources.get_object() if form_resources is not None else {}
+            if xobject.get("/Subtype") == "/Form" and "/Font" in form_resources:
+                return True
+    return False
+
+
+def text_quality(text):
+    """
+    Scores extracted text between 0 (unusable) and 1, to choose between extraction engines.
+    Unreadable characters, "(cid:...)" glyph references and glued words (missing spaces) lower the score.
+    """
+    if not text.strip():
+        return 0.0
+    readable = sum(char.isalnum() or char.isspace() or char in PDF_PUNCTUATION for char in text)
+    score = readable / len(text)
+    score -= 8 * len(PDF_ARTIFACT_PATTERN.findall(text)) / len(text)
+    words = text.split()
+    if sum(len(word) for word in words) / len(words) > 15:
+        score /= 2
+    return max(score, 0.0)
+
+
+def _pages_text(pages, max_pages, max_chars, deadline):
+    """Text of the first pages, stopping at the page or character budget, or past the deadline."""
+    texts = []
+    chars = 0
+    for page in itertools.islice(pages, max_pages):
+        if time.monotonic() > deadline:
+            break
+        text = (page.extract_text() or "").replace("\x00", "")
+        texts.append(text)
+        chars += len(text)
+        if chars >= max_chars:
+            break
+    return texts
+
+
+def _extract_pdf(file, max_pages, max_chars, deadline, span):
+    """Page texts of a PDF, with the engine chosen on the quality of the extracted text."""
+    try:
+        reader = pdf.PdfReader(_as_stream(file))
+        if not has_text_layer(reader, max_pages):
+            span.set(engine=None, image_only=True, pages=len(reader.pages))
+            return []
+        pages = _pages_text(reader.pages, max_pages, max_chars, deadline)
+        quality = text_quality("\n".join(pages))
+        span.set(engine="PyPDF2", pages=len(reader.pages), quality=round(quality, 2))
+        if quality >= PDF_MIN_QUALITY:
+            return pages
+    except Exception as e:
+        metrics.event("import.pdf_fallback", reason=type(e).__name__)
+        pages, quality = [], 0.0
+    else:
+        if time.monotonic() > deadline:  # Budget de temps épuisé : pas de second essai
+            return pages
+        metrics.event("import.pdf_fallback", reason="quality", quality=round(quality, 2))
 
-    text = text.replace("\x00", "").replace("\n", " ").strip()
+    # PyPDF2 n'a pas pu lire le PDF, ou son texte est de mauvaise qualité : essai avec pdfplumber
+    try:
+        with pdfplumber.open(_as_stream(file)) as pdf_p:
+            plumber_pages = _pages_text(pdf_p.pages, max_pages, max_chars, deadline)
+            plumber_quality = text_quality("\n".join(plumber_pages))
+            if plumber_quality > quality:
+                span.set(engine="pdfplumber", pages=len(pdf_p.pages), quality=round(plumber_quality, 2))
+                return plumber_pages
+    except Exception:
+        if not pages:
+            raise
+        logging.warning("pdfplumber n'a pas pu lire le PDF, texte de PyPDF2 conservé.")
+    return pages
+
+
+def _run_in_thread(fn, *args):
+    """
+    Runs `fn` in a dedicated daemon thread and returns its Future. An abandoned (stuck) call neither
+    delays the next ones, as it would in a fixed-size pool, nor prevents the process from exiting.
+    The context is copied so that the events emitted by the thread belong to the current document.
+    """
+    future = concurrent.futures.Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True, name="pdf").start()
+    return future
+
+
+def extract_text_from_pdf(file, keep_lines=False, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS, timeout=PDF_TIMEOUT):
+    """
+    Extracts text from the first pages of a PDF file.
+
+    Image-only PDFs are detected before any text is parsed. PyPDF2 is used first, and pdfplumber
+    when PyPDF2 cannot read the file or when its text scores lower than PDF_MIN_QUALITY.
+    Extraction runs in a worker thread, on its own copy of the file, so that a malformed PDF cannot
+    stall the import past `timeout`.
+
+    Args:
+        file (str | bytes | file-like): The path to the PDF file, its content, or a binary file object.
+        keep_lines (bool): Keep the line structure (one line per line of the PDF), used by the compaction.
+        max_pages (int): Number of pages read from the start of the document.
+        max_chars (int): Extraction stops at the end of the page where this number of characters is reached.
+        timeout (float): Time (in seconds) after which the extraction is abandoned.
+
+    Returns:
+        str: The extracted text from the PDF, with newlines replaced by spaces (unless `keep_lines`)
+             and leading/trailing whitespace removed. Empty for image-only PDFs.
+
+    Raises:
+        TimeoutError: The extraction did not finish within `timeout` seconds (the mail is then
+                      reported as an error, and retried on the next import).
+    """
+    with metrics.span("import.pdf_text") as span:
+        deadline = time.monotonic() + timeout
+        # Copie du contenu : après un abandon, le thread peut encore lire pendant que l'appelant réutilise le fichier
+        if not isinstance(file, (str, os.PathLike)):
+            file = _as_stream(file).read()
+        future = _run_in_thread(_extract_pdf, file, max_pages, max_chars, deadline, span)
+        try:
+            pages = future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            metrics.event("import.pdf_timeout")
+            span.set(timeout=True)
+            raise TimeoutError(f"Extraction du PDF abandonnée après {timeout} secondes.")
+
+        text = ("\n" if keep_lines else " ").join(pages).strip()
+        if not keep_lines:
+            text = text.replace("\n", " ")
+        span.set(chars=len(text))
     return text
 
 
-def extract_text_from_docx(file):
+@metrics.timed("import.docx_text")
+def extract_text_from_docx(file, keep_lines=False):
     """
     Extracts text from a DOCX file, including text from tables and paragraphs.
     Args:
-        file (str): The path to the DOCX file.
+        file (str | bytes | file-like): The path to the DOCX file, its content, or a binary file object.
+        keep_lines (bool): Keep one line per table row and paragraph, with tab-separated cells (used by the compaction).
     Returns:
         str: The extracted text with table cells separated by tabs, paragraphs separated by spaces, 
              and non-breaking spaces replaced by regular spaces.
     """
-    doc = Document(file)
+    doc = Document(_as_stream(file))
     text = []
 
     # Extract text from tables
@@ -138,29 +293,25 @@ def extract_text_from_docx(file):
     for para in doc.paragraphs:
         text.append(para.text)
 
-    cleaned_text = (
-        "\n".join(text)
-        .replace("\xa0", " ")
-        .replace("\n", " ")
-        .replace("\t", " ")
-        .strip()
-        )
-    return cleaned_text
+    cleaned_text = "\n".join(text).replace("\xa0", " ")
+    if not keep_lines:
+        cleaned_text = cleaned_text.replace("\n", " ").replace("\t", " ")
+    return cleaned_text.strip()
 
 
-def anonymize_cv(text_cv, noms_from_email):
-    # 1. Extraction de l'email avant anonymisation
-    email_match = re.search(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', text_cv)
-    extracted_email = email_match.group(0) if email_match else None
+class CVAnonymizer:
+    """
+    Anonymizes CV text with precompiled patterns.
 
-    # Si un email est trouvé, on cherche à couper au niveau de l'extension après l'@
-    if extracted_email:
-        domain_match = re.search(r"@[^@]+(\.com|\.net|\.fr)", extracted_email)  # On cherche après l'@
-        if domain_match:
-            extracted_email = extracted_email[:domain_match.end()]  # Coupe après l'extension
+    The substitution order of the original implementation is kept (names, then emails, phone and
+    address), since each pass works on the output of the previous one: for instance an email whose
+    local part contains the candidate's name is no longer matched once the name is replaced.
+    All name fragments are replaced in a single scan through one alternation, longest first.
+    """
 
-    # 2. Extraction du numéro de téléphone avant anonymisation
-    phone_pattern = re.compile(r'''
+    EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+    EMAIL_DOMAIN_PATTERN = re.compile(r"@[^@]+(\.com|\.net|\.fr)")
+    PHONE_PATTERN = re.compile(r'''
         (?<!\d)                     # Ne pas être précédé par un chiffre
         (?:\+?\d{1,3}[-.\s]?)?      # Code pays optionnel (ex: +33)
         (?!2\d{3}[-.\s])            # Ne pas commencer par 2 suivi de 3 chiffres
@@ -169,44 +320,97 @@ def anonymize_cv(text_cv, noms_from_email):
         \d{2,4}                     # Dernier groupe de 2 à 4 chiffres
         (?!\d)                      # Ne pas être suivi par un chiffre
     ''', re.VERBOSE)
+    ADDRESS_PATTERN = re.compile(r'\d{1,5}\s+\w+(?:\s+\w+)*(?:,\s*\w+(?:\s+\w+)*)?,?\s*\d{5}')
+    # Une adresse ne peut pas sortir d'une suite de caractères [\w\s,] et se termine par 5 chiffres :
+    # on ne lance l'expression (coûteuse en backtracking) que sur les segments qui peuvent en contenir une
+    ADDRESS_SEGMENT_PATTERN = re.compile(r'[\w\s,]+')
+    POSTAL_CODE_PATTERN = re.compile(r'\d{5}')
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _names_pattern(noms):
+        # Les noms les plus longs en premier pour éviter les conflits
+        alternation = "|".join(re.escape(nom) for nom in sorted(noms, key=len, reverse=True))
+        return re.compile(alternation, re.IGNORECASE)
+
+    def extract_email(self, text_cv):
+        email_match = self.EMAIL_PATTERN.search(text_cv)
+        if not email_match:
+            return None
+        extracted_email = email_match.group(0)
+
+        # On cherche à couper au niveau de l'extension après l'@
+        domain_match = self.EMAIL_DOMAIN_PATTERN.search(extracted_email)
+        if domain_match:
+            extracted_email = extracted_email[:domain_match.end()]  # Coupe après l'extension
+        return extracted_email
+
+    def extract_phone(self, text_cv):
+        # Premier match ne commençant pas par "1" ou "2", pour éliminer les années
+        for match in self.PHONE_PATTERN.finditer(text_cv):
+            if not match.group(0).strip().startswith(('1', '2')):
+                return match.group(0)
+        return None
+
+    def _anonymize_address(self, segment_match):
+        segment = segment_match.group(0)
+        if not self.POSTAL_CODE_PATTERN.search(segment):
+            return segment
+        return self.ADDRESS_PATTERN.sub('[ADRESSE]', segment)
+
+    def anonymize(self, text_cv, noms_from_email):
+        # 1. et 2. Extraction de l'email et du numéro de téléphone avant anonymisation
+        extracted_email = self.extract_email(text_cv)
+        extracted_phone = self.extract_phone(text_cv)
+
+        # 3. Suppression du nom et prénom, même s'ils sont collés à d'autres mots
+        noms = tuple(nom for nom in noms_from_email if nom)
+        if noms:
+            text_cv = self._names_pattern(noms).sub('[ANONYMISÉ]', text_cv)
 
-    # Récupérer tous les matchs
-    phone_matches = phone_pattern.findall(text_cv)
+        # 4. Suppression de l'email (remplacement après extraction)
+        text_cv = self.EMAIL_PATTERN.sub('[EMAIL]', text_cv)
 
-    # Filtrer les matchs pour éliminer ceux qui commencent par "1" ou "2" pour éliminer  les années
-    filtered_matches = [match for match in phone_matches if not match.strip().startswith(('1', '2'))]
-    extracted_phone =filtered_matches[0] if filtered_matches else None
-    
-    # 3. Suppression du nom et prénom, même s'ils sont collés à d'autres mots
-    for nom in sorted(noms_from_email, key=len, reverse=True):  # Trier pour éviter les conflits
-        text_cv = re.sub(rf'(?i){re.escape(nom)}', '[ANONYMISÉ]', text_cv)
+        # 5. Suppression des numéros de téléphone
+        if extracted_phone:
+            text_cv = text_cv.replace(extracted_phone, '[TÉL]')
 
-    # 4. Suppression de l'email (remplacement après extraction)
-    text_cv = re.sub(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', '[EMAIL]', text_cv)
+        # 6. Suppression de l'adresse postale (basique, peut être affiné)
+        text_cv = self.ADDRESS_SEGMENT_PATTERN.sub(self._anonymize_address, text_cv)
 
-    # 5. Suppression des numéros de téléphone
-    if extracted_phone:
-        text_cv = text_cv.replace(extracted_phone, '[TÉL]')
-    
-    # 6. Suppression de l'adresse postale (basique, peut être affiné)
-    text_cv = re.sub(r'\d{1,5}\s+\w+(?:\s+\w+)*(?:,\s*\w+(?:\s+\w+)*)?,?\s*\d{5}', '[ADRESSE]', text_cv)
+        return text_cv, extracted_email, extracted_phone
 
-    return text_cv, extracted_email, extracted_phone  # On retourne le texte anonymisé + l'email et le numéro de téléphone extraits
+
+anonymizer = CVAnonymizer()
+
+
+@metrics.timed("import.anonymize")
+def anonymize_cv(text_cv, noms_from_email):
+    """
+    Anonymizes a CV and extracts the candidate's email and phone number.
+    Args:
+        text_cv (str): The CV text.
+        noms_from_email (list): Name fragments of the candidate, taken from the email subject.
+    Returns:
+        tuple: The anonymized text, the extracted email and the extracted phone number (or None).
+    """
+    return anonymizer.anonymize(text_cv, noms_from_email)
+
+# Champs attendus dans la réponse du LLM, avec leur valeur par défaut
+LLM_REQUIRED_FIELDS = {
+    "Freelance": "N/A",
+    "Année de diplomation": "N/A",
+    "Expérience": -1,
+    "Entreprises": "N/A",
+    "Compétences": "N/A"
+}
 
 def validate_llm_response(response):
     """
     Vérifie que la réponse du LLM contient tous les champs attendus.
     Si un champ est manquant, il est complété avec une valeur par défaut.
     """
-    required_fields = {
-        "Freelance": "N/A",
-        "Année de diplomation": "N/A",
-        "Expérience": -1,
-        "Entreprises": "N/A",
-        "Compétences": "N/A"
-    }
-    
-    for field, default_value in required_fields.items():
+    for field, default_value in LLM_REQUIRED_FIELDS.items():
         if field not in response:
             logging.warning(f"Champ manquant dans la réponse du LLM : {field}. Attribution de la valeur par défaut {default_value}.")
             response[field] = default_value
@@ -235,27 +439,16 @@ def guess_extension(cv_bytes):
             return ext
     return "bin"  # Par défaut, inconnu
 
-def generate_download_link(cv_binary, filename="cv"):
-    """ Génère un lien de téléchargement HTML pour un fichier binaire. """
-    if isinstance(cv_binary, Binary):  # Vérifier si c'est un objet Binary de MongoDB
-        cv_bytes = cv_binary.decode()
-    elif isinstance(cv_binary, bytes):
-        cv_bytes = cv_binary
-    else:
-        return "✖️"
+# Types MIME des formats de CV
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "doc": "application/msword",
+}
 
+def cv_file_info(cv_bytes, filename="cv"):
+    """ Nom de fichier (avec extension) et type MIME d'un CV, pour son téléchargement. """
     file_extension = guess_extension(cv_bytes)
     full_filename = f"{filename}.{file_extension}"
-
-    # Déterminer le type MIME
-    mime_types = {
-        "pdf": "application/pdf",
-        "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "doc": "application/msword",
-    }
-    mime_type = mime_types.get(file_extension, "application/octet-stream")  # Fallback générique
-
-    # Encodage base64
-    b64 = base64.b64encode(cv_bytes).decode()
-    href = f'<a href="data:{mime_type};base64,{b64}" download="{full_filename}">📄</a>'
-    return href
+    mime_type = MIME_TYPES.get(file_extension, "application/octet-stream")  # Fallback générique
+    return full_filename, mime_type
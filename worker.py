@@ -0,0 +1,89 @@
+"""
+Worker de la file d'attente des imports (voir jobs.py).
+
+Usage : python -m worker [--batch 15] [--workers 5] [--rpm 15] [--once]
+
+Plusieurs workers peuvent tourner en même temps : chacun réserve ses mails de façon atomique.
+Le quota Gemini étant lié à la clé d'API, il est partagé par tous les workers (et l'import en ligne
+de commande) via MongoDB ; `--rpm` est le quota de la clé, pas celui du worker.
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+import metrics
+from llm_cache import ExtractionCache
+from pipeline import commit_result, llm_backend, process_mails
+from rate_limit import SharedRateLimiter
+from jobs import LEASE_RENEW_SECONDS, claim_items, complete_item, item_mail, job_settings, renew_leases
+from config import (
+    cache_collection, quota_collection, GEMINI_MAX_WORKERS, GEMINI_PACK_SIZE, GEMINI_RPM, GEMINI_TPM,
+    LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_ENTRIES,
+)
+
+
+def run_batch(items, cache, max_workers, limiter, pack_size=GEMINI_PACK_SIZE):
+    """
+    Traite un lot de mails réservés. Chaque candidat est enregistré dès que son mail est traité :
+    un arrêt du worker ne fait perdre aucun appel au LLM déjà effectué.
+    """
+    jobs = job_settings({item["job_id"] for item in items})
+    for result in process_mails(
+        (item_mail(item) for item in items), cache, max_workers, limiter=limiter, pack_size=pack_size
+    ):
+        item = items[result["index"]]
+        # L'option de stockage des CV est propre à chaque import
+        counts = commit_result(result, jobs[item["job_id"]]["store_cv"])
+        if not complete_item(item, result, counts):
+            logging.warning(f"{item['filename']} : réservation expirée, le mail a été repris par un autre worker.")
+    metrics.flush()
+
+
+def keep_leases(worker_id, stop):
+    """
+    Renouvelle les réservations du worker tant qu'il tourne : un appel au LLM peut attendre le quota
+    plus longtemps que la durée d'une réservation sans que le mail soit repris par un autre worker.
+    """
+    while not stop.wait(LEASE_RENEW_SECONDS):
+        try:
+            renew_leases(worker_id)
+        except Exception as e:
+            logging.warning(f"Renouvellement des réservations impossible : {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=15, help="Nombre de mails réservés à la fois")
+    parser.add_argument("--workers", type=int, default=GEMINI_MAX_WORKERS, help="Nombre d'appels simultanés au LLM")
+    parser.add_argument("--pack", type=int, default=GEMINI_PACK_SIZE, help="Nombre maximum de CV par requête au LLM")
+    parser.add_argument("--rpm", type=int, default=GEMINI_RPM, help="Requêtes par minute autorisées par la clé d'API")
+    parser.add_argument("--poll", type=float, default=5, help="Attente (en secondes) quand la file est vide")
+    parser.add_argument("--once", action="store_true", help="S'arrêter quand la file est vide")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    limiter = SharedRateLimiter(quota_collection, llm_backend.name, args.rpm, GEMINI_TPM * args.rpm // GEMINI_RPM)
+    cache = ExtractionCache(cache_collection, LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_ENTRIES)
+    logging.info(f"Worker {worker_id} démarré.")
+
+    stop = threading.Event()
+    threading.Thread(target=keep_leases, args=(worker_id, stop), daemon=True).start()
+    try:
+        while True:
+            items = claim_items(worker_id, args.batch)
+            if items:
+                logging.info(f"{len(items)} mail(s) réservé(s).")
+                run_batch(items, cache, args.workers, limiter, args.pack)
+            elif args.once:
+                break
+            else:
+                time.sleep(args.poll)
+    finally:
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()